@@ -1,145 +1,249 @@
 ﻿"""AgentEngineClient using Google's streaming Reasoning Engine over SSE with session management."""
 
+import asyncio
 import httpx
+from contextlib import aclosing
+from cachetools import LRUCache
 from typing import AsyncIterator
-from dataclasses import dataclass
 from auth_token_generator import get_token
 import json
 import logging
+import orjson
 import os
-import threading
-from typing import Optional, Tuple
-from config_loader import Config
+import time
+from typing import Dict, Optional, Tuple
+from config_loader import AgentEngineConfig
 
+logger = logging.getLogger(__name__)
 
-@dataclass(frozen=True)
-class AgentEngineConfig:
-    api_key: str  # Used as Google API Bearer token
-    endpoint: str
-    project: str
-    location: str
-    reasoning_engine_id: str
-    session_storage_path: str = None  # Path to sessions.json, defaults to 'sessions.json'
+# Error bodies are only logged, so never read or decode more than this
+ERROR_BODY_LIMIT = 4096
+
+
+def _canonical_channel(channel_id: Optional[str]) -> str:
+    """Sessions without a channel are keyed by "" everywhere, never None."""
+    return channel_id or ""
+
+
+async def _iter_lines(response: httpx.Response) -> AsyncIterator[bytes]:
+    """Yield complete lines from a streamed body as soon as each newline arrives."""
+    buf = bytearray()
+    # No chunk_size: httpx would otherwise hold data back until that many bytes had arrived
+    async for chunk in response.aiter_bytes():
+        buf.extend(chunk)
+        while (i := buf.find(b"\n")) >= 0:
+            line = bytes(buf[:i])
+            del buf[:i + 1]
+            yield line
+    if buf:
+        yield bytes(buf)
+
+
+async def _read_head(response: httpx.Response, limit: int = ERROR_BODY_LIMIT) -> bytes:
+    """Read at most `limit` bytes of a streamed body, e.g. for logging an error response."""
+    buf = b""
+    async for chunk in response.aiter_bytes(limit):
+        buf += chunk
+        if len(buf) >= limit:
+            break
+    return buf[:limit]
 
 
 class SessionStorage:
-    """Thread-safe persistent storage for sessions in JSON file."""
+    """In-memory session index, persisted to a JSON file by a background writer."""
+
+    # How long the writer waits after a change so a burst lands in one write
+    WRITE_DELAY_SECONDS = 0.5
 
     def __init__(self, path: str):
         self.path = path
-        self.lock = threading.Lock()
+        self.lock = asyncio.Lock()
         self._ensure_file_exists()
+        # Loaded on first access; every lookup after that is a dict hit
+        self._index: Optional[Dict[Tuple[str, str], str]] = None
+        self._dirty = asyncio.Event()
+        self._writer_task: Optional[asyncio.Task] = None
 
     def _ensure_file_exists(self):
         """Create the file if it doesn't exist."""
         if not os.path.exists(self.path):
             with open(self.path, 'w') as f:
                 json.dump([], f)
-            logging.info(f"Created sessions file at {self.path}")
+            logger.info("Created sessions file at %s", self.path)
+
+    def _read_file(self) -> list:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return []
+
+    def _write_file(self, sessions: list):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(sessions, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    async def _load_sessions(self) -> list:
+        """Load sessions from file without blocking the event loop."""
+        async with self.lock:
+            return await asyncio.to_thread(self._read_file)
 
-    def _load_sessions(self) -> list:
-        """Load sessions from file."""
-        with self.lock:
+    async def _save_sessions(self):
+        """Atomically write the current index to file without blocking the event loop."""
+        sessions = [
+            {'channel_id': channel_id, 'user_id': user_id, 'session_id': session_id}
+            for (channel_id, user_id), session_id in self._index.items()
+        ]
+        async with self.lock:
+            await asyncio.to_thread(self._write_file, sessions)
+
+    async def _get_index(self) -> Dict[Tuple[str, str], str]:
+        if self._index is None:
+            sessions = await self._load_sessions()
+            if self._index is None:
+                self._index = {
+                    (_canonical_channel(session.get('channel_id')), session['user_id']): session['session_id']
+                    for session in sessions
+                }
+                # One-time migration: rewrite legacy entries stored with a null channel_id
+                if any(session.get('channel_id') is None for session in sessions):
+                    self._mark_dirty()
+        return self._index
+
+    def _mark_dirty(self):
+        """Schedule a background write of the index."""
+        self._dirty.set()
+        if self._writer_task is None:
+            self._writer_task = asyncio.get_running_loop().create_task(self._write_behind())
+
+    async def _write_behind(self):
+        """Persist the index after changes, coalescing bursts into one write."""
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(self.WRITE_DELAY_SECONDS)
+            self._dirty.clear()
             try:
-                with open(self.path, 'r') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                return []
-
-    def _save_sessions(self, sessions: list):
-        """Save sessions to file."""
-        with self.lock:
-            with open(self.path, 'w') as f:
-                json.dump(sessions, f, indent=2)
-
-    def get_session(self, channel_id: str, user_id: str) -> Optional[dict]:
-        """Retrieve session by (channel_id, user_id) tuple. Falls back to user_id only if channel_id is None."""
-        sessions = self._load_sessions()
-        key = (channel_id, user_id) if channel_id else (None, user_id)
-        for session in sessions:
-            session_key = (session.get('channel_id'), session['user_id'])
-            if session_key == key:
-                return session
-        return None
-
-    def create_session(self, channel_id: str, user_id: str, session_id: str):
+                await self._save_sessions()
+            except Exception as e:
+                # Any failure is retried on the next change; letting it end the task would
+                # leave _writer_task set and stop persistence until restart
+                logger.error("Failed to persist sessions to %s: %s", self.path, e, exc_info=True)
+
+    async def close(self):
+        """Stop the background writer and flush any pending changes."""
+        if self._writer_task:
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+        if self._dirty.is_set():
+            self._dirty.clear()
+            await self._save_sessions()
+
+    async def get_session(self, channel_id: str, user_id: str) -> Optional[str]:
+        """Retrieve session_id by (channel_id, user_id) tuple. A missing channel_id is keyed as ""."""
+        index = await self._get_index()
+        return index.get((_canonical_channel(channel_id), user_id))
+
+    async def create_session(self, channel_id: str, user_id: str, session_id: str):
         """Create and store new session."""
-        sessions = self._load_sessions()
-        new_session = {
-            'channel_id': channel_id,
-            'user_id': user_id,
-            'session_id': session_id
-        }
-        sessions.append(new_session)
-        self._save_sessions(sessions)
-        logging.info(f"Created and stored session {session_id} for {channel_id}:{user_id}")
+        index = await self._get_index()
+        index[(_canonical_channel(channel_id), user_id)] = session_id
+        self._mark_dirty()
+        logger.info("Created and stored session %s for %s:%s", session_id, channel_id, user_id)
 
-    def update_session(self, channel_id: str, user_id: str, session_id: str):
+    async def update_session(self, channel_id: str, user_id: str, session_id: str):
         """Update existing session ID (e.g., if recreated)."""
-        sessions = self._load_sessions()
-        key = (channel_id, user_id)
-        for session in sessions:
-            if (session.get('channel_id'), session['user_id']) == key:
-                session['session_id'] = session_id
-                self._save_sessions(sessions)
-                logging.info(f"Updated session {session_id} for {channel_id}:{user_id}")
-                return
-        # If not found, create new
-        self.create_session(channel_id, user_id, session_id)
+        index = await self._get_index()
+        key = (_canonical_channel(channel_id), user_id)
+        if key not in index:
+            # If not found, create new
+            await self.create_session(channel_id, user_id, session_id)
+            return
+        index[key] = session_id
+        self._mark_dirty()
+        logger.info("Updated session %s for %s:%s", session_id, channel_id, user_id)
 
 
 class AgentEngineClient:
+    # stream_query yields buffered text once it reaches this size, ends a line, or this much time has passed
+    FLUSH_CHARS = 256
+    FLUSH_INTERVAL_SECONDS = 0.1
+
     def __init__(self, config: AgentEngineConfig):
         self.config = config
         self.token = config.api_key  # Treat api_key as bearer token
         storage_path = config.session_storage_path
         self.storage = SessionStorage(storage_path)
-        self._build_session_url = (
-            f"{self.config.endpoint}/projects/{self.config.project}"
-            f"/locations/{self.config.location}/reasoningEngines/"
-            f"{self.config.reasoning_engine_id}:query"
+        # Resolved session ids for recent (channel_id, user_id) pairs
+        self._sid_cache = LRUCache(maxsize=4096)
+        # At most config.max_concurrent_streams queries stream at once; further callers wait for a slot
+        self._stream_sem = asyncio.Semaphore(config.max_concurrent_streams)
+        # One pooled client for every request so connections (and TLS sessions) are reused;
+        # HTTP/2 lets session creation share the connection held open by an SSE stream.
+        # The read timeout bounds the gap between chunks, so a stalled stream gives up its slot.
+        self._client = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(None, connect=10.0, read=config.stream_read_timeout_seconds),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60.0),
         )
-
-    def _build_stream_url(self) -> str:
-        return (
+        engine_url = (
             f"{self.config.endpoint}/projects/{self.config.project}"
             f"/locations/{self.config.location}/reasoningEngines/"
-            f"{self.config.reasoning_engine_id}:streamQuery?alt=sse"
+            f"{self.config.reasoning_engine_id}"
         )
+        self._session_url = f"{engine_url}:query"
+        self._stream_url = f"{engine_url}:streamQuery?alt=sse"
+        self._base_headers = {"Content-Type": "application/json"}
+
+    async def warmup(self):
+        """Open a pooled connection to the endpoint so the first query skips the TLS handshake."""
+        try:
+            await self._client.head(self.config.endpoint)
+        except httpx.HTTPError as e:
+            logger.warning("Agent Engine connection warmup failed: %s", e)
+
+    async def aclose(self):
+        """Close the pooled HTTP client and flush pending session writes."""
+        await self._client.aclose()
+        await self.storage.close()
 
     async def _create_new_session(self, user_id: str) -> str:
         """Create a new session via API and return session_id."""
         token = get_token()
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-        }
+        headers = {**self._base_headers, "Authorization": f"Bearer {token}"}
         payload = {
             "class_method": "async_create_session",
             "input": {"user_id": user_id}
         }
 
-        async with httpx.AsyncClient(timeout=None) as client:
-            async with client.stream("POST", self._build_session_url, headers=headers, json=payload) as response:
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    logging.error(
-                        f"Session creation failed: {response.status_code}, "
-                        f"body: {error_text.decode(errors='replace')}"
-                    )
-                    raise ValueError(f"Failed to create session: HTTP {response.status_code}")
+        response = await self._client.post(self._session_url, headers=headers, json=payload)
+        if response.status_code != 200:
+            if logger.isEnabledFor(logging.ERROR):
+                head = response.content[:ERROR_BODY_LIMIT]
+                logger.error(
+                    "Session creation failed: %s, body(first %dB): %s",
+                    response.status_code, len(head), head.decode('utf-8', 'replace')
+                )
+            raise ValueError(f"Failed to create session: HTTP {response.status_code}")
 
-                # Read the full response body
-                response_text = await response.aread()
-                try:
-                    obj = json.loads(response_text.decode('utf-8'))
-                    session_id = obj.get("output", {}).get("id")
-                    if not session_id:
-                        raise ValueError("No session_id in response")
-                    return session_id
-                except (json.JSONDecodeError, KeyError) as e:
-                    logging.error(f"Failed to parse session response: {e}, body: {response_text.decode(errors='replace')}")
-                    raise ValueError(f"Invalid session response: {e}")
+        try:
+            obj = orjson.loads(response.content)
+            session_id = obj.get("output", {}).get("id")
+            if not session_id:
+                raise ValueError("No session_id in response")
+            return session_id
+        except (orjson.JSONDecodeError, KeyError) as e:
+            if logger.isEnabledFor(logging.ERROR):
+                head = response.content[:ERROR_BODY_LIMIT]
+                logger.error(
+                    "Failed to parse session response: %s, body(first %dB): %s",
+                    e, len(head), head.decode('utf-8', 'replace')
+                )
+            raise ValueError(f"Invalid session response: {e}")
 
     async def get_or_create_session(self, channel_id: Optional[str], user_id: str) -> str:
         """
@@ -149,14 +253,22 @@ class AgentEngineClient:
         :param user_id: Slack user ID
         :return: session_id (str)
         """
-        existing = self.storage.get_session(channel_id or "", user_id)
+        channel_id = _canonical_channel(channel_id)
+        key = (channel_id, user_id)
+        cached = self._sid_cache.get(key)
+        if cached:
+            return cached
+
+        existing = await self.storage.get_session(channel_id, user_id)
         if existing:
-            logging.info(f"Retrieved existing session {existing['session_id']} for {channel_id}:{user_id}")
-            return existing['session_id']
+            logger.info("Retrieved existing session %s for %s:%s", existing, channel_id, user_id)
+            self._sid_cache[key] = existing
+            return existing
 
         # Create new
         session_id = await self._create_new_session(user_id)
-        self.storage.create_session(channel_id or "", user_id, session_id)
+        await self.storage.create_session(channel_id, user_id, session_id)
+        self._sid_cache[key] = session_id
         return session_id
 
     async def stream_query(self, channel_id: Optional[str], user_id: str, message: str) -> AsyncIterator[str]:
@@ -168,13 +280,17 @@ class AgentEngineClient:
         :param message: Message history or text prompt
         :yield: Partial streamed responses
         """
+        # aclosing ends the HTTP stream, and frees the slot, as soon as the caller stops reading
+        async with self._stream_sem, aclosing(self._stream_query(channel_id, user_id, message)) as stream:
+            async for text in stream:
+                yield text
+
+    async def _stream_query(self, channel_id: Optional[str], user_id: str, message: str) -> AsyncIterator[str]:
+        """Unbounded stream_query; callers go through stream_query's concurrency limit."""
         session_id = await self.get_or_create_session(channel_id, user_id)
 
         token = get_token()
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-        }
+        headers = {**self._base_headers, "Authorization": f"Bearer {token}"}
 
         payload = {
             "class_method": "async_stream_query",
@@ -185,36 +301,55 @@ class AgentEngineClient:
             }
         }
 
-        url = self._build_stream_url()
-
-        async with httpx.AsyncClient(timeout=None) as client:
-            async with client.stream("POST", url, headers=headers, json=payload) as response:
-                if response.status_code != 200:
-                    error_text = await response.aread()
-                    logging.error(
-                        f"Received non-200 status: {response.status_code}, "
-                        f"response body: {error_text.decode(errors='replace')}"
+        async with self._client.stream("POST", self._stream_url, headers=headers, json=payload) as response:
+            if response.status_code != 200:
+                if logger.isEnabledFor(logging.ERROR):
+                    head = await _read_head(response)
+                    logger.error(
+                        "Received non-200 status: %s, response body(first %dB): %s",
+                        response.status_code, len(head), head.decode('utf-8', 'replace')
                     )
-                    return  # Or raise an exception, if you want the caller to handle it
+                return  # Or raise an exception, if you want the caller to handle it
 
-                async for line in response.aiter_lines():
-                    line = line.strip()
-                    if not line:
+            # Coalesce small deltas so callers see fewer, larger chunks
+            buf = []
+            size = 0
+            last_flush = time.monotonic()
+            async for raw_line in _iter_lines(response):
+                line = raw_line.strip()
+                if not line:
+                    continue
+                try:
+                    obj = orjson.loads(line)
+                    # Control frames carry no content; skip them without allocating defaults
+                    content = obj.get("content")
+                    if not content:
                         continue
-                    try:
-                        obj = json.loads(line)
-                        parts = obj.get("content", {}).get("parts", [])
-                        if not parts:
-                            continue
-
-                        first_part = parts[0]
-
-                        # Fallback to text if no function_response
-                        text = first_part.get("text")
-                        if text:
-                            yield text
-
-                    except (ValueError, KeyError, TypeError) as e:
-                        # Optionally log line or exception here
-                        logging.debug(f"Error parsing stream line: {e}, line: {line}")
+                    parts = content.get("parts")
+                    if not parts:
                         continue
+
+                    first_part = parts[0]
+
+                    # Fallback to text if no function_response
+                    text = first_part.get("text")
+
+                except (ValueError, KeyError, TypeError) as e:
+                    # Optionally log line or exception here
+                    logger.debug("Error parsing stream line: %s, line: %s", e, line)
+                    continue
+
+                if not text:
+                    continue
+                buf.append(text)
+                size += len(text)
+                now = time.monotonic()
+                if (size >= self.FLUSH_CHARS or text.endswith("\n")
+                        or now - last_flush > self.FLUSH_INTERVAL_SECONDS):
+                    yield "".join(buf)
+                    buf.clear()
+                    size = 0
+                    last_flush = now
+
+            if buf:
+                yield "".join(buf)
@@ -1,26 +1,35 @@
-﻿from google.oauth2 import service_account
+﻿import threading
+
+from google.oauth2 import service_account
 from google.auth.transport.requests import Request
 
+# Path to your service account JSON key
+SERVICE_ACCOUNT_FILE = 'service-account.json'
 
-def get_token() -> str:
-    # Path to your service account JSON key
-    service_account_file = 'service-account.json'
+# Scopes needed for your API (modify as needed)
+SCOPES = ['https://www.googleapis.com/auth/cloud-platform']
 
-    # Scopes needed for your API (modify as needed)
-    scopes = ['https://www.googleapis.com/auth/cloud-platform']
+_credentials = None
+_auth_request = None
+_lock = threading.Lock()
 
-    # Load credentials from the service account file
-    credentials = service_account.Credentials.from_service_account_file(
-        service_account_file,
-        scopes=scopes
-    )
 
-    # Create a request object for refreshing the token
-    auth_request = Request()
+def get_token() -> str:
+    global _credentials, _auth_request
+
+    with _lock:
+        # Load credentials and the refresh transport once per process
+        if _credentials is None:
+            _credentials = service_account.Credentials.from_service_account_file(
+                SERVICE_ACCOUNT_FILE,
+                scopes=SCOPES
+            )
+            _auth_request = Request()
 
-    # Refresh the token (this ensures the token is current and valid)
-    credentials.refresh(auth_request)
+        # Only hit the OAuth endpoint when the cached token is missing or about to expire;
+        # `valid` is already False within google-auth's refresh threshold of expiry
+        if not _credentials.valid:
+            _credentials.refresh(_auth_request)
 
-    # Get the access token string to use in your REST API request
-    access_token = credentials.token
-    return access_token
\ No newline at end of file
+        # Get the access token string to use in your REST API request
+        return _credentials.token
@@ -1,19 +1,42 @@
 """Simplified configuration loader for single bot-agent pair."""
 
-from pydantic import BaseModel, Field
-import json
+from dataclasses import MISSING, dataclass, field, fields, replace
+import orjson
 from pathlib import Path
-from typing import List
-
-
-class SlackBotConfig(BaseModel):
+from typing import Any, Dict, List, Tuple
+
+
+class _FromDict:
+    """Builds a config dataclass from a plain dict, checking required fields and scalar types."""
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data: Any):
+        if not isinstance(data, dict):
+            raise TypeError(f"{cls.__name__} must be an object, got {type(data).__name__}")
+        kwargs = {}
+        for f in fields(cls):
+            if f.name not in data:
+                if f.default is MISSING and f.default_factory is MISSING:
+                    raise ValueError(f"{cls.__name__}.{f.name} is required")
+                continue
+            value = data[f.name]
+            if f.type in (str, int) and not isinstance(value, f.type):
+                raise TypeError(f"{cls.__name__}.{f.name} must be {f.type.__name__}, got {type(value).__name__}")
+            kwargs[f.name] = value
+        return cls(**kwargs)
+
+
+@dataclass(frozen=True, slots=True)
+class SlackBotConfig(_FromDict):
     """Configuration for a single Slack bot."""
     name: str
     bot_token: str
     signing_secret: str
 
 
-class AgentEngineConfig(BaseModel):
+@dataclass(frozen=True, slots=True)
+class AgentEngineConfig(_FromDict):
     """Configuration for a single Agent Engine."""
     api_key: str  # Bearer token for Agent Engine
     endpoint: str
@@ -21,21 +44,32 @@ class AgentEngineConfig(BaseModel):
     location: str
     reasoning_engine_id: str
     session_storage_path: str = "session.json"
+    # Queries streaming at once across the bot; passive reviews must leave room for users
+    max_concurrent_streams: int = 32
+    # Longest wait for the next chunk of a query before the stream is abandoned
+    stream_read_timeout_seconds: int = 120
 
 
-class GlobalSettings(BaseModel):
+@dataclass(frozen=True, slots=True)
+class GlobalSettings(_FromDict):
     """Global application settings."""
     log_level: str = "INFO"
     session_timeout_minutes: int = 30
+    session_low: int = 1000
+    session_high: int = 10000
+    # Bind with SO_REUSEPORT so copies of this bot can share a port; off so a port clash fails fast
+    reuse_port: bool = False
 
 
-class ChannelMapping(BaseModel):
+@dataclass(frozen=True, slots=True)
+class ChannelMapping(_FromDict):
     """Defines a mapping for passive monitoring."""
     monitored_channel_id: str
     notification_channel_id: str
 
 
-class MetricsConfig(BaseModel):
+@dataclass(frozen=True, slots=True)
+class MetricsConfig(_FromDict):
     """Configuration for metrics tracking."""
     metrics_storage_path: str = "metrics.csv"
     time_saved_per_autonomous_response_minutes: int = 10
@@ -43,14 +77,23 @@ class MetricsConfig(BaseModel):
     time_saved_per_relay_minutes: int = 2
 
 
-class PassiveMonitoringConfig(BaseModel):
+@dataclass(frozen=True, slots=True)
+class PassiveMonitoringConfig(_FromDict):
     """Configuration for passive monitoring."""
     no_response_timeout_minutes: int = 480
-    channel_mappings: List[ChannelMapping] = Field(default_factory=list)
+    channel_mappings: List[ChannelMapping] = field(default_factory=list)
     thread_link_storage_path: str = "thread_links.json"
+    max_parallel_reviews: int = 8
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "PassiveMonitoringConfig":
+        config = super(PassiveMonitoringConfig, cls).from_dict(data)
+        mappings = [ChannelMapping.from_dict(m) for m in data.get("channel_mappings", [])]
+        return replace(config, channel_mappings=mappings)
 
 
-class Config(BaseModel):
+@dataclass(frozen=True, slots=True)
+class Config(_FromDict):
     """Simplified configuration for single bot-agent pair."""
     global_settings: GlobalSettings
     slack_bot: SlackBotConfig
@@ -58,6 +101,26 @@ class Config(BaseModel):
     passive_monitoring: PassiveMonitoringConfig
     metrics: MetricsConfig
 
+    @classmethod
+    def from_dict(cls, data: Any) -> "Config":
+        if not isinstance(data, dict):
+            raise TypeError(f"Config must be an object, got {type(data).__name__}")
+        children = {}
+        for f in fields(cls):
+            if f.name not in data:
+                raise ValueError(f"Config.{f.name} is required")
+            children[f.name] = f.type.from_dict(data[f.name])
+        # Each passive review streams one query at a time; keep slots free for mentions and DMs
+        if children["passive_monitoring"].max_parallel_reviews >= children["agent_engine"].max_concurrent_streams:
+            raise ValueError(
+                "passive_monitoring.max_parallel_reviews must be less than agent_engine.max_concurrent_streams"
+            )
+        return cls(**children)
+
+
+# Parsed configs keyed by (path, mtime_ns) so an unchanged file is never re-validated
+_CONFIG_CACHE: Dict[Tuple[str, int], Config] = {}
+
 
 def load_config(path: str) -> Config:
     """
@@ -66,12 +129,19 @@ def load_config(path: str) -> Config:
     config_path = Path(path)
     if not config_path.exists():
         raise FileNotFoundError(f"Configuration file not found: {path}")
-    
+
+    key = (str(config_path), config_path.stat().st_mtime_ns)
+    cached = _CONFIG_CACHE.get(key)
+    if cached is not None:
+        return cached
+
     try:
-        with open(path, 'r') as f:
-            data = json.load(f)
-        return Config.model_validate(data)
-    except json.JSONDecodeError as e:
+        data = orjson.loads(config_path.read_bytes())
+        config = Config.from_dict(data)
+    except orjson.JSONDecodeError as e:
         raise ValueError(f"Invalid JSON in config file: {e}")
     except Exception as e:
         raise ValueError(f"Invalid configuration format: {e}")
+
+    _CONFIG_CACHE[key] = config
+    return config
@@ -3,9 +3,9 @@
 Deduplication tools for Slack event handlers.
 """
 
+from collections import OrderedDict
 from functools import wraps
-from cachetools import LRUCache
-from asyncio import Lock
+from typing import Optional
 import logging
 
 
@@ -16,33 +16,76 @@ class DuplicateEventError(Exception):
 
 class SlackEventDeduplicator:
     """
-    Deduplicates event keys using LRUCache (thread-safe for asyncio).
+    Deduplicates event keys using an OrderedDict LRU.
+    No lock needed: the check and insert never yield to the event loop.
     """
 
     def __init__(self, max_events=1000):
-        self._cache = LRUCache(maxsize=max_events)
-        self._lock = Lock()
+        self._cache = OrderedDict()
+        self.max = max_events
         self.logger = logging.getLogger("SlackEventDeduplicator")
 
-    async def is_duplicate(self, dedup_key: str) -> bool:
-        async with self._lock:
-            if dedup_key in self._cache:
-                self.logger.warning(f"Duplicate deduplication key seen: {dedup_key}")
-                return True
-            self._cache[dedup_key] = True
-            return False
+    def is_duplicate(self, dedup_key: tuple) -> bool:
+        if dedup_key in self._cache:
+            self._cache.move_to_end(dedup_key)
+            self.logger.warning("Duplicate deduplication key seen: %s", dedup_key)
+            return True
+        self._cache[dedup_key] = True
+        if len(self._cache) > self.max:
+            self._cache.popitem(last=False)
+        return False
 
 
 DEDUPLICATOR = SlackEventDeduplicator()
 
+# (label, path) pairs tried in order; the first non-empty value becomes the dedup key.
+_KEY_EXTRACTORS = (
+    ("event_id", ("event_id",)),
+    ("client_msg_id", ("client_msg_id",)),
+    ("thread_id", ("assistant_thread", "thread_ts")),
+    ("event_ts", ("event_ts",)),
+)
+
+
+def _compile_path(path):
+    """Build a getter for a key path; single-key paths become a direct dict.get."""
+    if len(path) == 1:
+        key = path[0]
+        return lambda event: event.get(key)
+
+    def walk(event):
+        value = event
+        for key in path:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+        return value
+
+    return walk
+
+
+def _extract_dedup_key(event: dict, getters) -> Optional[tuple]:
+    """Return a (label, value) key for the first getter that hits, or None."""
+    for label, get in getters:
+        value = get(event)
+        if value:
+            return label, value
+    return None
+
 
 def deduplicate_event(
         event_id_path=("event_id",),
         client_msg_id_key="client_msg_id"
 ):
     """
-    Deduplicates based on event_id, or (fallback) client_msg_id at the top-level.
+    Deduplicates based on event_id, or (fallback) client_msg_id, assistant thread_ts
+    or event_ts at the top-level.
     """
+    extractors = (
+        ("event_id", tuple(event_id_path)),
+        ("client_msg_id", (client_msg_id_key,)),
+    ) + _KEY_EXTRACTORS[2:]
+    getters = tuple((label, _compile_path(path)) for label, path in extractors)
 
     def decorator(fn):
         @wraps(fn)
@@ -60,28 +103,14 @@ def deduplicate_event(
                 logger.debug("Could not extract event dict for deduplication.")
                 return await fn(*args, **kwargs)
 
-            eid = event
-            for key in event_id_path:
-                if not isinstance(eid, dict):
-                    eid = None
-                    break
-                eid = eid.get(key)
-
-            if eid:
-                dedup_key = f"event_id:{eid}"
-                label = "event_id"
-            else:
-                cid = event.get(client_msg_id_key)
-                if cid:
-                    dedup_key = f"client_msg_id:{cid}"
-                    label = "client_msg_id"
-                else:
-                    # This event has no ID to deduplicate on, so we must let it pass.
-                    # This is expected for some event types.
-                    return await fn(*args, **kwargs)
-
-            if await DEDUPLICATOR.is_duplicate(dedup_key):
-                logger.warning(f"Duplicate event detected by {label}: {dedup_key}. Skipping handler.")
+            dedup_key = _extract_dedup_key(event, getters)
+            if dedup_key is None:
+                # This event has no ID to deduplicate on, so we must let it pass.
+                # This is expected for some event types.
+                return await fn(*args, **kwargs)
+
+            if DEDUPLICATOR.is_duplicate(dedup_key):
+                logger.warning("Duplicate event detected by %s: %s. Skipping handler.", dedup_key[0], dedup_key)
                 return  # Skip duplicate
 
             return await fn(*args, **kwargs)
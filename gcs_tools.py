@@ -1,54 +1,77 @@
-﻿import os
-import json
-from google.cloud import storage
-from google.oauth2 import service_account
+﻿import gzip
+import os
+import orjson
+from gcloud.aio.storage import Storage
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# JSONL is very repetitive; level 1 gets most of the size win at near-copy speed
+GZIP_LEVEL = 1
 
-def get_gcs_client():
-    """
-    Returns a Google Cloud Storage client authenticated with service-account.json in project root or as set in env.
-    """
-    # Prefer SERVICE_ACCOUNT_JSON from env, else default
-    sa_path = os.getenv("SERVICE_ACCOUNT_JSON", "./service-account.json")
-    if not os.path.exists(sa_path):
-        raise FileNotFoundError(
-            f"Service account file not found at {sa_path}. "
-            f"Set SERVICE_ACCOUNT_JSON env var or place service-account.json in project root."
-        )
-    creds = service_account.Credentials.from_service_account_file(sa_path)
-    return storage.Client(credentials=creds)
-
-def json_to_jsonl(data):
+# orjson emits UTF-8 bytes that are uploaded as-is, so say so instead of leaving readers to guess
+JSONL_CONTENT_TYPE = "application/json; charset=utf-8"
+
+# Async client for upload_json_to_gcs_async; created on first use so its aiohttp
+# session belongs to the running event loop, and closed by close_async_storage().
+_async_storage = None
+
+
+def _iter_records(data):
     """
-    Accepts a list of dicts or a dict containing one list as a value.
-    Returns a JSONL (newline-delimited) string.
+    Accepts a list of dicts or a dict containing one list as a value, or the same as
+    a JSON str/bytes. Returns an iterator over the records to write, one per JSONL line.
+    Input is validated up front so a bad type fails before any upload starts.
     """
-    if isinstance(data, str):
-        data = json.loads(data)
+    # Already-parsed lists are the common case; skip the other type checks
     if isinstance(data, list):
-        lines = [json.dumps(obj, ensure_ascii=False) for obj in data]
-        return '\n'.join(lines)
+        return iter(data)
+    if isinstance(data, (str, bytes, bytearray, memoryview)):
+        data = orjson.loads(data)
+    if isinstance(data, list):
+        return iter(data)
     elif isinstance(data, dict):
-        array_keys = [k for k, v in data.items() if isinstance(v, list)]
-        if len(array_keys) == 1:
-            records = data[array_keys[0]]
-            lines = [json.dumps(obj, ensure_ascii=False) for obj in records]
-            return '\n'.join(lines)
+        # Find the single list-valued key, stopping as soon as a second one shows up
+        found = None
+        multiple = False
+        for k, v in data.items():
+            if isinstance(v, list):
+                if found is not None:
+                    multiple = True
+                    break
+                found = k
+        if found is not None and not multiple:
+            return iter(data[found])
         else:
-            return json.dumps(data, ensure_ascii=False)
+            return iter((data,))
     else:
-        raise ValueError("Input must be list, dict, or JSON string.")
+        raise ValueError("Input must be list, dict, or JSON string/bytes.")
 
 
+def json_to_jsonl(data) -> bytes:
+    """
+    Accepts a list of dicts or a dict containing one list as a value.
+    Returns JSONL (newline-delimited) as UTF-8 bytes.
+    """
+    return b"\n".join(orjson.dumps(obj) for obj in _iter_records(data))
+
+
+def _get_async_storage():
+    global _async_storage
+    if _async_storage is None:
+        sa_path = os.getenv("SERVICE_ACCOUNT_JSON", "./service-account.json")
+        _async_storage = Storage(service_file=sa_path)
+    return _async_storage
 
-def upload_json_to_gcs(json_data, filename, bucket_path):
+
+async def upload_json_to_gcs_async(json_data, filename, bucket_path):
     """
-    Upload a Python dict or list as a JSONL file to Google Cloud Storage.
+    Upload a Python dict or list as a gzip-compressed JSONL file to Google Cloud Storage.
+    Uploads share one authenticated aiohttp session, so several can run concurrently
+    on the event loop (e.g. via asyncio.gather); GCS serves the file decompressed to
+    clients that ask.
     Args:
-        json_data: dict or list to upload (input to JSONL converter).
+        json_data: dict or list to upload, or the same already serialized as JSON str/bytes.
         filename: The filename (not full path).
         bucket_path: Folder/path inside the bucket; should be the Slack bot's name.
     Returns:
@@ -58,17 +81,22 @@ def upload_json_to_gcs(json_data, filename, bucket_path):
     if not bucket_name:
         raise ValueError("GCS_BUCKET_NAME must be set in the .env")
 
-    client = get_gcs_client()
-    bucket = client.get_bucket(bucket_name)
     full_path = f"{bucket_path}/{filename}" if bucket_path else filename
+    body = gzip.compress(json_to_jsonl(json_data), compresslevel=GZIP_LEVEL)
 
-    # Convert to JSONL string
-    jsonl_str = json_to_jsonl(json_data)
-
-    blob = bucket.blob(full_path)
-    blob.upload_from_string(
-        jsonl_str,
-        content_type="application/json"
+    await _get_async_storage().upload(
+        bucket_name,
+        full_path,
+        body,
+        content_type=JSONL_CONTENT_TYPE,
+        metadata={"contentEncoding": "gzip"}
     )
     return f"gs://{bucket_name}/{full_path}"
 
+
+async def close_async_storage():
+    """Close the shared async storage session, if one was opened."""
+    global _async_storage
+    if _async_storage is not None:
+        await _async_storage.close()
+        _async_storage = None
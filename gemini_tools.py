@@ -1,8 +1,21 @@
 ﻿import vertexai
 from vertexai.generative_models import GenerativeModel, Part
 from google.oauth2 import service_account
+import functools
 import json
+import orjson
 import re
+import threading
+
+# Leading code fence with optional 'json' or other label (case-insensitive)
+_FENCE_START = re.compile(r'^```[ \t]*json?.*?\n', re.IGNORECASE)
+# Trailing code fence (common: ```
+_FENCE_END = re.compile(r'\n?```[\s]*$')
+
+# (sa_path, location) vertexai was last initialized with
+_vertex_target = None
+_vertex_lock = threading.Lock()
+
 
 def remove_friendly_response_field(summary_dict):
     """
@@ -25,13 +38,14 @@ def clean_llm_output(raw: str) -> str:
     Removes Markdown code fences from the start and end of LLM output,
     including variations like ```json or ```
     """
-    # Trim whitespace first
-    text = raw.strip()
-    # Remove leading code fence with optional 'json' or other label (case-insensitive)
-    text = re.sub(r'^```[ \t]*[jJ][sS][oO][nN]?.*?\n', '', text)
-    # Remove trailing code fence (common: ```
-    text = re.sub(r'\n?```[\s]*$', '', text)
+    # Trim whitespace first, then strip the leading and trailing fences
+    text = _FENCE_START.sub('', raw.strip())
+    text = _FENCE_END.sub('', text)
     return text.strip()
+
+
+# The service account file doesn't change while the process runs, so read it once per path
+@functools.lru_cache(maxsize=4)
 def get_project_id_from_service_account(sa_path: str = "./service-account.json"):
     with open(sa_path, "r") as f:
         data = json.load(f)
@@ -39,6 +53,55 @@ def get_project_id_from_service_account(sa_path: str = "./service-account.json")
     return data["project_id"]
 
 
+# Static analysis prompt; only user_id and log_thread vary per call
+_ANALYZE_PROMPT_TMPL = """
+    Given the message thread log below, summarize it as this JSON structure:
+
+    {{
+      "issue_summary": "<Concise summary of key issue/goal, what agent did, and user outcome>",
+      "interaction": [<full list of messages as objects like {{"from": "user"/"agent", "text": "<content>"}}>],
+      "reaction": "<short emoji or reaction that marked user sentiment if present, else null>",
+      "sentiment": "<positive|negative|neutral, as assessed>",
+      "key_entities": [<key entities or topics, as short strings>],
+      "should_have_done": "<What could the agent or workflow have done better to improve outcome; or 'no significant changes needed.'>",
+      "friendly_response_to_user": "<What the agent should respond to the user in first person, thanking them for their feedback. The user's name should be addressed as `<@{user_id}>`, so that slack mentions them in your response. should be short and contextually appropriate. If the feedback is negative, it should very briefly tell the user what it thinks it might do better next time.>"
+    }}
+
+    Here is the complete message thread log (as raw JSON):
+
+    {log_thread}
+
+    Respond ONLY with the raw JSON object, without markdown, code fences, or any explanations. Output must be valid JSON, nothing else.
+    """
+
+
+@functools.lru_cache(maxsize=4)
+def _get_credentials(sa_path: str):
+    return service_account.Credentials.from_service_account_file(sa_path)
+
+
+def _init_vertex(sa_path: str, location: str):
+    """Run vertexai.init only when the (service account, location) target changes."""
+    global _vertex_target
+    target = (sa_path, location)
+    if _vertex_target == target:
+        return
+    with _vertex_lock:
+        if _vertex_target != target:
+            vertexai.init(
+                project=get_project_id_from_service_account(sa_path),
+                location=location,
+                credentials=_get_credentials(sa_path),
+            )
+            _vertex_target = target
+
+
+@functools.lru_cache(maxsize=8)
+def _get_model(model_name: str, location: str):
+    # location is part of the key because a model binds to the location vertexai was initialized with
+    return GenerativeModel(model_name)
+
+
 # gemini_tools.py
 
 def quick_working_response(
@@ -61,9 +124,7 @@ def quick_working_response(
         str: A short, friendly message for the user.
     """
 
-    sa_path = "./service-account.json"
-    credentials = service_account.Credentials.from_service_account_file(sa_path)
-    vertexai.init(project=get_project_id_from_service_account(sa_path), location=location, credentials=credentials)
+    _init_vertex("./service-account.json", location)
 
     prompt = (
         f"You are a helpful Slack bot. The following message was just received from Slack user <@{user_id}>: '{message}'.\n"
@@ -80,7 +141,7 @@ def quick_working_response(
         "Reply ONLY in Slack format, 1-2 sentences. Do not include explanations or apologies."
     )
 
-    model = GenerativeModel(model_name)
+    model = _get_model(model_name, location)
     response = model.generate_content([Part.from_text(prompt)])
     reply = response.text.strip()
     # Minimal cleanup if needed
@@ -98,40 +159,18 @@ def analyze_log_vertexai_with_json(
     Use a hardcoded path to service-account.json for Vertex AI Gemini analysis.
     Returns structured JSON as specified.
     """
-    # 1. Load credentials from file
-    credentials = service_account.Credentials.from_service_account_file(sa_path)
-
-    # 2. Init Vertex AI with creds, project, location
-    vertexai.init(project=get_project_id_from_service_account(sa_path), location=location, credentials=credentials)
+    # 1. Init Vertex AI with cached creds, project, location (no-op after the first call)
+    _init_vertex(sa_path, location)
 
-    prompt = f"""
-    Given the message thread log below, summarize it as this JSON structure:
-
-    {{
-      "issue_summary": "<Concise summary of key issue/goal, what agent did, and user outcome>",
-      "interaction": [<full list of messages as objects like {{"from": "user"/"agent", "text": "<content>"}}>],
-      "reaction": "<short emoji or reaction that marked user sentiment if present, else null>",
-      "sentiment": "<positive|negative|neutral, as assessed>",
-      "key_entities": [<key entities or topics, as short strings>],
-      "should_have_done": "<What could the agent or workflow have done better to improve outcome; or 'no significant changes needed.'>",
-      "friendly_response_to_user": "<What the agent should respond to the user in first person, thanking them for their feedback. The user's name should be addressed as `<@{user_id}>`, so that slack mentions them in your response. should be short and contextually appropriate. If the feedback is negative, it should very briefly tell the user what it thinks it might do better next time.>"
-    }}
-
-    Here is the complete message thread log (as raw JSON):
-
-    {log_thread}
-
-    Respond ONLY with the raw JSON object, without markdown, code fences, or any explanations. Output must be valid JSON, nothing else.
-    """
+    prompt = _ANALYZE_PROMPT_TMPL.format(user_id=user_id, log_thread=log_thread)
 
-    # 3. Run Gemini with prompt
-    model = GenerativeModel(model_name)
+    # 2. Run Gemini with prompt
+    model = _get_model(model_name, location)
     response = model.generate_content([Part.from_text(prompt)])
 
-    import json
     try:
         json_str = clean_llm_output(response.text)
-        result = json.loads(json_str)
+        result = orjson.loads(json_str)
     except Exception as e:
         print("Error parsing Gemini output:", str(e))
         print("Raw output was:", response.text)
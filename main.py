@@ -8,24 +8,37 @@ taking the port as a command line argument.
 import argparse
 import asyncio
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 
-from config_loader import load_config
-from slack_bot import SlackBot
 
+def setup_logging(log_level: str = "INFO") -> QueueListener:
+    """
+    Setup logging configuration.
 
-def setup_logging(log_level: str = "INFO"):
-    """Setup logging configuration."""
+    Log calls only enqueue the record; a listener thread writes it to stdout and
+    the log file, so handlers on the event loop never wait on disk I/O.
+    Returns the started listener, which must be stopped on shutdown.
+    """
     numeric_level = getattr(logging, log_level.upper(), logging.INFO)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.StreamHandler(sys.stdout),
+        logging.FileHandler('slack_bot.log')
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(-1)
     logging.basicConfig(
         level=numeric_level,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(sys.stdout),
-            logging.FileHandler('slack_bot.log')
-        ]
+        handlers=[QueueHandler(log_queue)]
     )
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
 
 
 def parse_arguments():
@@ -52,6 +65,16 @@ async def main_async():
     """Main asynchronous entry point."""
     args = parse_arguments()
 
+    # Validate configuration file exists before paying for any heavy imports
+    config_path = Path(args.config)
+    if not config_path.exists():
+        print(f"Configuration file not found: {args.config}")
+        sys.exit(1)
+
+    # Deferred so --help and a bad path never import the bot stack (Vertex AI, GCS, Bolt)
+    from config_loader import load_config
+    from slack_bot import SlackBot
+
     # Load configuration
     try:
         config = load_config(args.config)
@@ -60,31 +83,26 @@ async def main_async():
         sys.exit(1)
 
     # Setup logging
-    setup_logging(config.global_settings.log_level)
+    log_listener = setup_logging(config.global_settings.log_level)
     logger = logging.getLogger(__name__)
 
-    # Validate configuration file exists
-    config_path = Path(args.config)
-    if not config_path.exists():
-        logger.error(f"Configuration file not found: {args.config}")
-        sys.exit(1)
-
     # Create the Slack bot
     bot = SlackBot(config, args.port)
     
     main_task = None
     try:
-        # Create a task for the bot's main run function
+        # Create a task for the bot's main run function; it returns once SIGINT/SIGTERM arrives
         main_task = asyncio.create_task(bot.start_async())
-        logger.info(f"Starting Slack bot '{config.slack_bot.name}' on port {args.port}")
-        logger.info(f"Using configuration: {args.config}")
+
+        logger.info("Starting Slack bot '%s' on port %s", config.slack_bot.name, args.port)
+        logger.info("Using configuration: %s", args.config)
         await main_task
         
     except (KeyboardInterrupt, asyncio.CancelledError):
         logger.info("Shutdown initiated...")
         
     except Exception as e:
-        logger.error(f"Bot error: {e}", exc_info=True)
+        logger.error("Bot error: %s", e, exc_info=True)
         sys.exit(1)
         
     finally:
@@ -94,11 +112,18 @@ async def main_async():
         # Ensure graceful shutdown of background tasks
         await bot.stop()
         logger.info("Slack bot stopped.")
+        log_listener.stop()
 
 
 if __name__ == '__main__':
     try:
-        asyncio.run(main_async())
+        # uvloop's libuv event loop where available (not on Windows), stdlib asyncio otherwise
+        try:
+            import uvloop
+        except ImportError:
+            asyncio.run(main_async())
+        else:
+            uvloop.run(main_async())
     except (KeyboardInterrupt, SystemExit):
         # This allows Ctrl+C to exit without a traceback
         pass
@@ -2,22 +2,32 @@
 A thread-safe, time series metrics tracker that logs events to a CSV file.
 """
 
+import atexit
 import csv
 import logging
 import os
+import queue
+import threading
+import time
 from datetime import datetime, timezone
-from threading import Lock
 from typing import Optional
 
 from config_loader import MetricsConfig
 
+# Queue sentinel telling the flusher thread to write what it has and exit
+_STOP = object()
+
 
 class MetricsCSVTracker:
     """
     Handles the logging of events to a CSV file for time series analysis.
-    This class is thread-safe.
+    This class is thread-safe: rows are queued and written in batches by a
+    background thread, so callers never wait on file I/O.
     """
 
+    FLUSH_BATCH_SIZE = 100
+    FLUSH_INTERVAL_SECONDS = 5.0
+
     _HEADERS = [
         "timestamp",
         "event_type",
@@ -39,22 +49,71 @@ class MetricsCSVTracker:
         self.config = config
         self.bot_name = bot_name
         self.filepath = self.config.metrics_storage_path
-        self._lock = Lock()
         self._ensure_file_exists()
         self.logger = logging.getLogger(__name__)
+        # Held open for the tracker's lifetime; only the flusher thread writes to it
+        self._fh = open(self.filepath, 'a', newline='', encoding='utf-8')
+        self._writerows = csv.writer(self._fh).writerows
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name=f"metrics-flush-{bot_name}", daemon=True
+        )
+        self._flusher.start()
+        atexit.register(self.close)
         self.logger.info(f"MetricsCSVTracker initialized for bot '{self.bot_name}' at {self.filepath}")
 
     def _ensure_file_exists(self):
         """Creates the CSV file with a header row if it doesn't exist."""
-        with self._lock:
-            if not os.path.exists(self.filepath):
+        if not os.path.exists(self.filepath):
+            try:
+                with open(self.filepath, 'w', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(self._HEADERS)
+                logging.info(f"Created new metrics file with headers at {self.filepath}")
+            except IOError as e:
+                logging.error(f"Failed to create metrics file at {self.filepath}: {e}")
+
+    def _write_rows(self, rows: list):
+        """Appends a batch of rows to the open CSV file and flushes it."""
+        try:
+            self._writerows(rows)
+            self._fh.flush()
+        except IOError as e:
+            self.logger.error(f"Failed to write to metrics file {self.filepath}: {e}")
+        except Exception as e:
+            self.logger.error(f"An unexpected error occurred while logging metrics: {e}")
+
+    def _flush_loop(self):
+        """Collects queued rows into batches and writes each batch in one go."""
+        while True:
+            row = self._queue.get()
+            if row is _STOP:
+                return
+            rows = [row]
+            stop = False
+            deadline = time.monotonic() + self.FLUSH_INTERVAL_SECONDS
+            while len(rows) < self.FLUSH_BATCH_SIZE:
                 try:
-                    with open(self.filepath, 'w', newline='', encoding='utf-8') as f:
-                        writer = csv.writer(f)
-                        writer.writerow(self._HEADERS)
-                    logging.info(f"Created new metrics file with headers at {self.filepath}")
-                except IOError as e:
-                    logging.error(f"Failed to create metrics file at {self.filepath}: {e}")
+                    row = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if row is _STOP:
+                    stop = True
+                    break
+                rows.append(row)
+            self._write_rows(rows)
+            if stop:
+                return
+
+    def close(self):
+        """Writes any queued rows, stops the flusher thread and closes the file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._flusher.join(timeout=10)
+        self._fh.close()
 
     def log_event(
         self,
@@ -65,7 +124,7 @@ class MetricsCSVTracker:
         sentiment_value: Optional[str] = None,
     ):
         """
-        Logs a single event by appending a new row to the CSV file.
+        Logs a single event by queueing a new row for the CSV file.
 
         Args:
             event_type: The name of the event (e.g., 'autonomous_response').
@@ -75,22 +134,12 @@ class MetricsCSVTracker:
             sentiment_value: The sentiment of a user reaction ('positive' or 'negative').
         """
         timestamp = datetime.now(timezone.utc).isoformat()
-        row = {
-            "timestamp": timestamp,
-            "event_type": event_type,
-            "bot_name": self.bot_name,
-            "channel_id": channel_id,
-            "thread_ts": thread_ts,
-            "time_saved_minutes": time_saved_minutes,
-            "sentiment_value": sentiment_value,
-        }
-
-        with self._lock:
-            try:
-                with open(self.filepath, 'a', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=self._HEADERS)
-                    writer.writerow(row)
-            except IOError as e:
-                self.logger.error(f"Failed to write to metrics file {self.filepath}: {e}")
-            except Exception as e:
-                self.logger.error(f"An unexpected error occurred while logging metrics: {e}")
+        self._queue.put((
+            timestamp,
+            event_type,
+            self.bot_name,
+            channel_id,
+            thread_ts,
+            time_saved_minutes,
+            sentiment_value,
+        ))
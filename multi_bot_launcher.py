@@ -9,11 +9,16 @@ Each bot runs in its own process for better isolation and Linux compatibility.
 import argparse
 import json
 import logging
+import os
+import selectors
+import signal
+import socket
 import subprocess
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
 
 class MultiBotLauncher:
@@ -27,6 +32,68 @@ class MultiBotLauncher:
     def __init__(self):
         self.processes: List[subprocess.Popen] = []
         self.logger = logging.getLogger(__name__)
+        # Child exits are waited on through pidfds registered here (Linux 5.3+);
+        # if any pidfd can't be opened, monitoring falls back to polling.
+        self.selector = selectors.DefaultSelector()
+        self._use_pidfds = True
+        # Trailing partial line of each bot's output (by PID), held until its newline arrives
+        self._partial_lines: Dict[int, bytearray] = {}
+
+    def _watch_exit(self, process: subprocess.Popen):
+        """Register a pidfd for the process so the selector wakes when it exits."""
+        if not self._use_pidfds:
+            return
+        try:
+            fd = os.pidfd_open(process.pid)
+        except (AttributeError, OSError) as e:
+            self.logger.info("pidfd unavailable (%s), falling back to polling child processes", e)
+            self._use_pidfds = False
+            return
+        self.selector.register(fd, selectors.EVENT_READ, data=("exit", process))
+
+    def _watch_output(self, process: subprocess.Popen):
+        """Read the process's stdout as it's written, so a chatty bot never blocks on a full pipe."""
+        if not self._use_pidfds:
+            return
+        os.set_blocking(process.stdout.fileno(), False)
+        self.selector.register(process.stdout, selectors.EVENT_READ, data=("stdout", process))
+
+    def _read_output(self, process: subprocess.Popen) -> bool:
+        """Log the complete lines in one chunk of the process's stdout. Returns False once nothing more is available."""
+        try:
+            chunk = os.read(process.stdout.fileno(), 65536)
+        except BlockingIOError:
+            return False
+        buf = self._partial_lines.setdefault(process.pid, bytearray())
+        if not chunk:
+            self.selector.unregister(process.stdout)
+            process.stdout.close()
+            del self._partial_lines[process.pid]
+            self._log_output(process, buf)
+            return False
+        buf += chunk
+        end = buf.rfind(b"\n")
+        if end >= 0:
+            self._log_output(process, buf[:end])
+            del buf[:end + 1]
+        return True
+
+    def _log_output(self, process: subprocess.Popen, data: bytes):
+        """Log bot output, decoding it only if INFO is enabled."""
+        if data and self.logger.isEnabledFor(logging.INFO):
+            self.logger.info("Process %s output: %s", process.pid, data.decode('utf-8', 'replace'))
+
+    def _ensure_fd_headroom(self, count: int):
+        """Raise the open-file soft limit if the pidfds we need would get close to it."""
+        try:
+            import resource
+        except ImportError:
+            return
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        needed = count * 2 + 64
+        if soft != resource.RLIM_INFINITY and soft < needed:
+            new_soft = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
     
     def launch_bots(self, configs: List[Dict[str, Any]]):
         """
@@ -35,12 +102,15 @@ class MultiBotLauncher:
         Args:
             configs: List of configuration dictionaries with 'config_file' and 'port'
         """
+        self._ensure_fd_headroom(len(configs))
+
+        launched = []
         for bot_config in configs:
             config_file = bot_config['config_file']
             port = bot_config['port']
             
             if not Path(config_file).exists():
-                self.logger.error(f"Config file not found: {config_file}")
+                self.logger.error("Config file not found: %s", config_file)
                 continue
             
             try:
@@ -52,39 +122,120 @@ class MultiBotLauncher:
                     '--config', config_file
                 ]
                 
-                self.logger.info(f"Starting bot with config {config_file} on port {port}")
+                self.logger.info("Starting bot with config %s on port %s", config_file, port)
                 process = subprocess.Popen(
                     cmd,
                     stdout=subprocess.PIPE,
                     stderr=subprocess.STDOUT,
-                    text=True,
-                    bufsize=1,
-                    universal_newlines=True
+                    bufsize=0
                 )
                 
                 self.processes.append(process)
-                self.logger.info(f"Started bot process PID {process.pid}")
-                
-                # Give process time to start
-                time.sleep(2)
+                self._watch_exit(process)
+                self._watch_output(process)
+                self.logger.info("Started bot process PID %s", process.pid)
+                launched.append((process, port))
                 
             except Exception as e:
-                self.logger.error(f"Failed to start bot with config {config_file}: {e}")
+                self.logger.error("Failed to start bot with config %s: %s", config_file, e)
+
+        if launched:
+            self.await_readiness(launched)
+
+    def await_readiness(self, launched: List[Tuple[subprocess.Popen, int]], timeout: float = 30.0):
+        """
+        Wait for the launched bots' HTTP servers to accept connections.
+
+        All ports are probed concurrently, so startup costs as long as the slowest bot
+        rather than a fixed delay per bot. Bots that aren't up by the deadline are logged.
+        """
+        deadline = time.monotonic() + timeout
+        with ThreadPoolExecutor(max_workers=min(32, len(launched))) as pool:
+            ready = list(pool.map(lambda item: self._wait_for_port(*item, deadline), launched))
+
+        for (process, port), ok in zip(launched, ready):
+            if ok:
+                self.logger.info("Bot process PID %s is accepting connections on port %s", process.pid, port)
+            else:
+                self.logger.warning("Bot process PID %s did not become ready on port %s", process.pid, port)
+
+    @staticmethod
+    def _wait_for_port(process: subprocess.Popen, port: int, deadline: float) -> bool:
+        """Retry connecting to the bot's port with exponential backoff until it answers or the deadline passes."""
+        delay = 0.05
+        while process.poll() is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=remaining):
+                    return True
+            except OSError:
+                time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+                delay = min(delay * 2, 2.0)
+        return False
     
+    def _watch_signals(self):
+        """
+        Route SIGINT/SIGTERM through a self-pipe on the selector, so a signal wakes
+        select() immediately instead of racing a KeyboardInterrupt through the loop.
+        """
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        os.set_blocking(write_fd, False)
+        signal.set_wakeup_fd(write_fd)
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: None)
+        self.selector.register(read_fd, selectors.EVENT_READ, data=("signal", None))
+
+    def _has_live_children(self) -> bool:
+        return any(key.data[0] == "exit" for key in self.selector.get_map().values())
+
     def monitor_processes(self):
-        """Monitor bot processes and restart if they fail."""
+        """Monitor bot processes and report when they exit."""
+        if not self._use_pidfds:
+            self._poll_processes()
+            return
+
+        self._watch_signals()
+
+        # One selector for every event source: child output, child exits and shutdown signals
+        while self._has_live_children():
+            for key, _ in self.selector.select():
+                kind, process = key.data
+                if kind == "stdout":
+                    self._read_output(process)
+                elif kind == "exit":
+                    self.selector.unregister(key.fd)
+                    os.close(key.fd)
+                    process.wait()
+                    while not process.stdout.closed and self._read_output(process):
+                        pass
+                    self._report_exit(process)
+                else:
+                    os.read(key.fd, 512)
+                    self.logger.info("Received shutdown signal")
+                    self.shutdown_all()
+                    return
+        self.logger.warning("All bot processes have exited")
+
+    def _report_exit(self, process: subprocess.Popen):
+        """Log a terminated process."""
+        self.logger.warning("Bot process PID %s has terminated with code %s", process.pid, process.returncode)
+
+    def _poll_processes(self):
+        """Fallback monitor for platforms without pidfd support."""
         while True:
             try:
                 for i, process in enumerate(self.processes):
                     if process.poll() is not None:
                         # Process has terminated
-                        self.logger.warning(f"Bot process PID {process.pid} has terminated with code {process.returncode}")
-                        
+                        self._report_exit(process)
+
                         # Read any remaining output
                         if process.stdout:
                             output = process.stdout.read()
-                            if output:
-                                self.logger.info(f"Process output: {output}")
+                            self._log_output(process, output)
                 
                 time.sleep(10)  # Check every 10 seconds
                 
@@ -93,30 +244,59 @@ class MultiBotLauncher:
                 self.shutdown_all()
                 break
             except Exception as e:
-                self.logger.error(f"Error monitoring processes: {e}")
+                self.logger.error("Error monitoring processes: %s", e)
                 time.sleep(10)
     
     def shutdown_all(self):
-        """Shutdown all bot processes gracefully."""
+        """
+        Shutdown all bot processes gracefully.
+
+        Every bot is sent SIGTERM up front and they share one 10s grace period,
+        so shutdown time doesn't grow with the number of bots.
+        """
         self.logger.info("Shutting down all bot processes...")
-        
-        for process in self.processes:
-            if process.poll() is None:  # Process is still running
-                try:
-                    self.logger.info(f"Terminating process PID {process.pid}")
-                    process.terminate()
-                    
-                    # Wait for graceful shutdown
-                    try:
-                        process.wait(timeout=10)
-                    except subprocess.TimeoutExpired:
-                        self.logger.warning(f"Force killing process PID {process.pid}")
-                        process.kill()
+
+        running = [process for process in self.processes if process.poll() is None]
+        for process in running:
+            try:
+                self.logger.info("Terminating process PID %s", process.pid)
+                process.terminate()
+            except Exception as e:
+                self.logger.error("Error shutting down process PID %s: %s", process.pid, e)
+
+        deadline = time.monotonic() + 10
+        if self._use_pidfds:
+            pending = {
+                key.fd: key.data[1] for key in list(self.selector.get_map().values())
+                if key.data[0] == "exit" and key.data[1] in running
+            }
+            while pending and (remaining := deadline - time.monotonic()) > 0:
+                for key, _ in self.selector.select(remaining):
+                    kind, process = key.data
+                    if kind == "stdout":
+                        self._read_output(process)
+                    elif kind == "signal":
+                        os.read(key.fd, 512)
+                    else:
+                        # Children that exited before shutdown (e.g. on Ctrl-C) still have
+                        # readable pidfds; retire every one that fires so select() can't spin
+                        pending.pop(key.fd, None)
+                        self.selector.unregister(key.fd)
+                        os.close(key.fd)
                         process.wait()
-                    
-                except Exception as e:
-                    self.logger.error(f"Error shutting down process PID {process.pid}: {e}")
-        
+        else:
+            for process in running:
+                try:
+                    process.wait(timeout=max(deadline - time.monotonic(), 0))
+                except subprocess.TimeoutExpired:
+                    pass
+
+        for process in running:
+            if process.poll() is None:
+                self.logger.warning("Force killing process PID %s", process.pid)
+                process.kill()
+                process.wait()
+
         self.logger.info("All processes shut down")
 
 
@@ -143,7 +323,7 @@ def load_multi_bot_config(config_file: str) -> List[Dict[str, Any]]:
             data = json.load(f)
         return data.get('bots', [])
     except Exception as e:
-        logging.error(f"Error loading multi-bot config: {e}")
+        logging.error("Error loading multi-bot config: %s", e)
         return []
 
 
@@ -193,10 +373,10 @@ def main():
             # Launch multiple bots from config
             configs = load_multi_bot_config(args.config)
             if not configs:
-                logger.error(f"No bot configurations found in {args.config}")
+                logger.error("No bot configurations found in %s", args.config)
                 sys.exit(1)
         
-        logger.info(f"Launching {len(configs)} bot processes")
+        logger.info("Launching %s bot processes", len(configs))
         launcher.launch_bots(configs)
         
         if launcher.processes:
@@ -209,7 +389,7 @@ def main():
     except KeyboardInterrupt:
         logger.info("Received interrupt signal")
     except Exception as e:
-        logger.error(f"Launcher error: {e}")
+        logger.error("Launcher error: %s", e)
         sys.exit(1)
     finally:
         launcher.shutdown_all()
@@ -5,9 +5,13 @@ autonomous responses to unanswered technical questions.
 """
 
 import asyncio
+import heapq
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, Any
+import re
+import time
+from collections import defaultdict
+from contextlib import aclosing
+from typing import Dict, Any, List, Optional, Tuple
 
 from slack_sdk.web.async_client import AsyncWebClient
 from agent_engine_client import AgentEngineClient
@@ -16,6 +20,17 @@ from thread_link_storage import ThreadLinkStorage
 from metrics_tracker import MetricsCSVTracker
 from slack_message_handler import markdown_to_slack
 
+logger = logging.getLogger(__name__)
+
+# Messages that can't be a technical question are rejected before asking the classifier
+_MIN_QUESTION_CHARS = 15
+_TECH_RE = re.compile(
+    r"\?|```|https?://|\b(?:error|exception|traceback|stack ?trace|install|deploy|crash|fail(?:s|ed|ing|ure)?"
+    r"|timeout|api|http|sql|query|config|permission|access|bug|issue|broken|debug|build|version"
+    r"|how|why|what|where|when|which|can|does|is there|anyone know)\b",
+    re.IGNORECASE,
+)
+
 
 class PassiveMessageHandler:
     def __init__(
@@ -32,6 +47,12 @@ class PassiveMessageHandler:
         self.thread_linker = thread_linker
         self.metrics_tracker = metrics_tracker
         self.watched_threads = {}
+        # (deadline, thread_key) min-heap; entries for threads already removed are skipped when popped
+        self._expiry_heap: List[Tuple[float, Tuple[str, str]]] = []
+        # Timestamps are time.monotonic() values, so expiry is unaffected by wall-clock jumps
+        self._timeout_seconds = self.config.no_response_timeout_minutes * 60.0
+        # Caps how many expired threads are processed (Slack + Agent Engine calls) at once
+        self._review_sem = asyncio.Semaphore(self.config.max_parallel_reviews)
         self.monitored_channels = {
             mapping.monitored_channel_id: mapping.notification_channel_id
             for mapping in self.config.channel_mappings
@@ -42,133 +63,198 @@ class PassiveMessageHandler:
         Checks if a message is a candidate for passive monitoring and adds it to the watch list.
         """
         channel_id = event.get("channel")
-
         if channel_id not in self.monitored_channels:
             return
-        if event.get("bot_id") or "<@" in event.get("text", ""):
+        text = event.get("text") or ""
+        if event.get("bot_id") or "<@" in text:
             return
 
-        if event.get("thread_ts"):
-            thread_key = f"{channel_id}-{event.get('thread_ts')}"
-            if thread_key in self.watched_threads:
-                if event.get("user") != self.watched_threads[thread_key]["user_id"]:
-                    del self.watched_threads[thread_key]
-                    logging.info(f"Thread {thread_key} received a reply, removing from watch list.")
-                    self.metrics_tracker.log_event(
-                        "thread_resolved_by_human",
-                        channel_id=channel_id,
-                        thread_ts=event.get("thread_ts"),
-                    )
+        user_id = event.get("user")
+        thread_ts = event.get("thread_ts")
+        if thread_ts:
+            thread_key = (channel_id, thread_ts)
+            watched = self.watched_threads.get(thread_key)
+            if watched is not None and user_id != watched["user_id"]:
+                del self.watched_threads[thread_key]
+                logger.info("Thread %s received a reply, removing from watch list.", thread_key)
+                self.metrics_tracker.log_event(
+                    "thread_resolved_by_human",
+                    channel_id=channel_id,
+                    thread_ts=thread_ts,
+                )
             return
 
         message_ts = event.get("ts")
-        user_id = event.get("user")
-        text = event.get("text")
-
-        if not all([channel_id, message_ts, user_id, text]):
+        if not (message_ts and user_id and text):
             return
 
-        thread_key = f"{channel_id}-{message_ts}"
+        thread_key = (channel_id, message_ts)
+        now = time.monotonic()
         self.watched_threads[thread_key] = {
             "channel_id": channel_id,
             "thread_ts": message_ts,
             "user_id": user_id,
             "text": text,
-            "timestamp": datetime.now(),
+            "timestamp": now,
         }
-        logging.info(f"Watching new thread in channel {channel_id}: {thread_key}")
+        heapq.heappush(self._expiry_heap, (now + self._timeout_seconds, thread_key))
+        logger.info("Watching new thread in channel %s: %s", channel_id, thread_key)
         self.metrics_tracker.log_event("thread_watched", channel_id=channel_id, thread_ts=message_ts)
 
     async def review_watched_threads(self):
         """
         Periodically reviews watched threads and processes expired ones in parallel.
         """
-        now = datetime.now()
-        timeout = timedelta(minutes=self.config.no_response_timeout_minutes)
-        
-        expired_threads = []
-        threads_to_keep = {}
+        now = time.monotonic()
+        heap = self._expiry_heap
 
-        for thread_key, thread_data in self.watched_threads.items():
-            if now - thread_data["timestamp"] > timeout:
-                expired_threads.append(thread_data)
-            else:
-                threads_to_keep[thread_key] = thread_data
-        
-        self.watched_threads = threads_to_keep
+        # Only the expired heads of the heap are touched, not every watched thread
+        expired_threads = []
+        while heap and heap[0][0] < now:
+            deadline, thread_key = heapq.heappop(heap)
+            thread_data = self.watched_threads.get(thread_key)
+            if thread_data is None or thread_data["timestamp"] + self._timeout_seconds != deadline:
+                continue
+            del self.watched_threads[thread_key]
+            expired_threads.append(thread_data)
 
         if not expired_threads:
             return
 
-        logging.info(f"Processing {len(expired_threads)} expired threads in parallel.")
-        
-        tasks = [self._process_single_thread(thread_data) for thread_data in expired_threads]
+        logger.info("Processing %s expired threads in parallel.", len(expired_threads))
+
+        by_channel = defaultdict(list)
+        for thread_data in expired_threads:
+            by_channel[thread_data["channel_id"]].append(thread_data)
+        channel_ids = list(by_channel)
+        reply_counts = await asyncio.gather(
+            *(self._fetch_reply_counts(channel_id, by_channel[channel_id]) for channel_id in channel_ids)
+        )
+
+        tasks = [
+            self._process_single_thread(thread_data, counts.get(thread_data["thread_ts"]))
+            for channel_id, counts in zip(channel_ids, reply_counts)
+            for thread_data in by_channel[channel_id]
+        ]
         await asyncio.gather(*tasks)
 
-    async def _process_single_thread(self, thread_data: Dict[str, Any]):
+    async def _fetch_reply_counts(self, channel_id: str, threads: List[Dict[str, Any]]) -> Dict[str, int]:
         """
-        Processes a single expired thread to determine if a response is warranted.
+        Fetch reply counts for a channel's expired threads with one conversations.history call
+        spanning their timestamps. Threads missing from the result are checked individually.
         """
-        thread_key = f"{thread_data['channel_id']}-{thread_data['thread_ts']}"
+        timestamps = [thread_data["thread_ts"] for thread_data in threads]
         try:
-            replies = await self.client.conversations_replies(
-                channel=thread_data["channel_id"], ts=thread_data["thread_ts"], limit=1
+            history = await self.client.conversations_history(
+                channel=channel_id,
+                oldest=min(timestamps, key=float),
+                latest=max(timestamps, key=float),
+                inclusive=True,
+                limit=1000,
             )
-            if len(replies.get("messages", [])) > 1:
-                logging.info(f"Thread {thread_key} has replies, skipping autonomous response.")
-                return
+        except Exception as e:
+            logger.warning("Could not batch reply counts for channel %s: %s", channel_id, e)
+            return {}
+        return {message["ts"]: message.get("reply_count", 0) for message in history.get("messages", [])}
 
-            if await self._is_technical_question(thread_data["text"]):
-                logging.info(f"Thread {thread_key} is an unanswered technical question. Responding.")
-                
-                response = await self._generate_response(thread_data["text"], thread_data["user_id"])
-                formatted_response = markdown_to_slack(response)
+    async def _process_single_thread(self, thread_data: Dict[str, Any], reply_count: Optional[int] = None):
+        """
+        Processes a single expired thread to determine if a response is warranted.
+        """
+        async with self._review_sem:
+            thread_key = (thread_data["channel_id"], thread_data["thread_ts"])
+            try:
+                if reply_count is None:
+                    replies = await self.client.conversations_replies(
+                        channel=thread_data["channel_id"], ts=thread_data["thread_ts"], limit=1
+                    )
+                    reply_count = len(replies.get("messages", [])) - 1
+                if reply_count > 0:
+                    logger.info("Thread %s has replies, skipping autonomous response.", thread_key)
+                    return
+
+                if await self._is_technical_question(thread_data["text"]):
+                    logger.info("Thread %s is an unanswered technical question. Responding.", thread_key)
                 
-                await self.client.chat_postMessage(
-                    channel=thread_data["channel_id"],
-                    thread_ts=thread_data["thread_ts"],
-                    text=f"{formatted_response}\n\n(To continue this conversation, please mention me with `@Ask EDE`)"
-                )
+                    response = await self._generate_response(thread_data["text"], thread_data["user_id"])
+                    # Regex conversion of a long reply is CPU-bound; keep it off the event loop
+                    formatted_response = await asyncio.to_thread(markdown_to_slack, response)
                 
-                self.metrics_tracker.log_event(
-                    "autonomous_response",
-                    channel_id=thread_data["channel_id"],
-                    thread_ts=thread_data["thread_ts"],
-                    time_saved_minutes=self.metrics_tracker.config.time_saved_per_autonomous_response_minutes,
-                )
-
-                notification_channel_id = self.monitored_channels.get(thread_data["channel_id"])
-                if notification_channel_id:
-                    notification_text = await self._generate_notification(thread_data["text"], response)
-                    
-                    permalink_response = await self.client.chat_getPermalink(
-                        channel=thread_data["channel_id"], message_ts=thread_data["thread_ts"]
+                    post_reply = self.client.chat_postMessage(
+                        channel=thread_data["channel_id"],
+                        thread_ts=thread_data["thread_ts"],
+                        text=f"{formatted_response}\n\n(To continue this conversation, please mention me with `@Ask EDE`)"
                     )
-                    permalink = permalink_response.get("permalink")
-                    
-                    if permalink:
-                        notification_text += f"\n\nYou can find the thread here: {permalink}"
 
-                    notification_post_response = await self.client.chat_postMessage(
-                        channel=notification_channel_id, text=notification_text
+                    # The notification text and the thread permalink don't depend on the posted reply,
+                    # so all three are in flight together. Their failures are handled separately, so
+                    # they can't undo the bookkeeping for a reply that was posted.
+                    notification_channel_id = self.monitored_channels.get(thread_data["channel_id"])
+                    if notification_channel_id:
+                        posted, notification_text, permalink_response = await asyncio.gather(
+                            post_reply,
+                            self._generate_notification(thread_data["text"], response),
+                            self.client.chat_getPermalink(
+                                channel=thread_data["channel_id"], message_ts=thread_data["thread_ts"]
+                            ),
+                            return_exceptions=True,
+                        )
+                        if isinstance(posted, BaseException):
+                            raise posted
+                    else:
+                        await post_reply
+
+                    self.metrics_tracker.log_event(
+                        "autonomous_response",
+                        channel_id=thread_data["channel_id"],
+                        thread_ts=thread_data["thread_ts"],
+                        time_saved_minutes=self.metrics_tracker.config.time_saved_per_autonomous_response_minutes,
                     )
+
+                    if notification_channel_id and isinstance(notification_text, BaseException):
+                        logger.error("Could not draft notification for thread %s: %s", thread_key, notification_text)
+                    elif notification_channel_id:
+                        if isinstance(permalink_response, BaseException):
+                            logger.warning("Could not fetch permalink for thread %s: %s", thread_key, permalink_response)
+                            permalink = None
+                        else:
+                            permalink = permalink_response.get("permalink")
                     
-                    notification_ts = notification_post_response.get("ts")
-                    if notification_ts:
-                        self.thread_linker.create_link(
-                            notification_ts=notification_ts,
-                            original_channel_id=thread_data["channel_id"],
-                            original_thread_ts=thread_data["thread_ts"],
+                        if permalink:
+                            notification_text += f"\n\nYou can find the thread here: {permalink}"
+
+                        notification_post_response = await self.client.chat_postMessage(
+                            channel=notification_channel_id, text=notification_text
                         )
-        except Exception as e:
-            logging.error(f"Error processing watched thread {thread_key}: {e}", exc_info=True)
+                    
+                        notification_ts = notification_post_response.get("ts")
+                        if notification_ts:
+                            self.thread_linker.create_link(
+                                notification_ts=notification_ts,
+                                original_channel_id=thread_data["channel_id"],
+                                original_thread_ts=thread_data["thread_ts"],
+                            )
+            except Exception as e:
+                logger.error("Error processing watched thread %s: %s", thread_key, e, exc_info=True)
 
     async def _is_technical_question(self, message: str) -> bool:
+        if len(message) < _MIN_QUESTION_CHARS or not _TECH_RE.search(message):
+            return False
         prompt = f"Is the following a technical question that can be answered? Respond with only 'yes' or 'no'.\n\n{message}"
-        response = ""
-        async for chunk in self.agent_engine_client.stream_query(None, "passive_monitoring_classifier", prompt):
-            response += chunk
-        return "yes" in response.lower()
+        chunks = []
+        # The model is told to answer only yes or no, so the first letter settles it; leaving the
+        # block closes the stream and drops the rest of the generation
+        async with aclosing(
+            self.agent_engine_client.stream_query(None, "passive_monitoring_classifier", prompt)
+        ) as stream:
+            async for chunk in stream:
+                chunks.append(chunk)
+                first = "".join(chunks).lstrip()[:1].lower()
+                if first == "y":
+                    return True
+                if first == "n":
+                    return False
+        return "yes" in "".join(chunks).lower()
 
     async def _generate_response(self, message: str, user_id: str) -> str:
         prompt = (
@@ -177,10 +263,10 @@ class PassiveMessageHandler:
             "Also, let them know that you have notified your support team and that someone will get back to them if more help is needed."
             f"\n\nHere is the user's question: \"{message}\""
         )
-        response = ""
+        chunks = []
         async for chunk in self.agent_engine_client.stream_query(None, user_id, prompt):
-            response += chunk
-        return response
+            chunks.append(chunk)
+        return "".join(chunks)
 
     async def _generate_notification(self, user_question: str, my_response: str) -> str:
         prompt = (
@@ -190,7 +276,7 @@ class PassiveMessageHandler:
             f"This was the user's question: \"{user_question}\"\n\n"
             f"This was your helpful response: \"{my_response}\""
         )
-        notification = ""
+        chunks = []
         async for chunk in self.agent_engine_client.stream_query(None, "passive_monitoring_notifier", prompt):
-            notification += chunk
-        return notification
+            chunks.append(chunk)
+        return "".join(chunks)
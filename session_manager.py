@@ -1,22 +1,60 @@
 ﻿import time
+from collections import OrderedDict
 
 class SessionManager:
-    def __init__(self, ttl_minutes=30):
-        self.sessions = {}  # (channel, thread) → session_id
-        self.last_used = {}
+    def __init__(self, ttl_minutes=30, maxsize=10000, low=1000, high=10000):
+        # (channel, thread) → (session_id, last_used), least recently used first. With one TTL
+        # for every session this is also expiry order, so the front is always the next to expire.
+        self.sessions = OrderedDict()
+        self.maxsize = maxsize
+        self.ttl = ttl_minutes * 60
+        # Above `low` live sessions the TTL shrinks linearly, reaching zero at `high`
+        self.low = low
+        self.high = high
 
     def get_or_create_session(self, channel, thread_ts):
         key = (channel, thread_ts)
-        if key not in self.sessions:
-            self.sessions[key] = f"session-{int(time.time())}"
-        return self.sessions[key]
+        now = time.time()
+        entry = self.sessions.get(key)
+        if entry is None:
+            session_id = f"session-{int(now)}"
+            if len(self.sessions) >= self.maxsize:
+                self.sessions.popitem(last=False)
+        else:
+            session_id = entry[0]
+            self.sessions.move_to_end(key)
+        self.sessions[key] = (session_id, now)
+        return session_id
 
     def update_last_used(self, channel, thread_ts):
-        self.last_used[(channel, thread_ts)] = time.time()
+        key = (channel, thread_ts)
+        entry = self.sessions.get(key)
+        if entry is not None:
+            self.sessions[key] = (entry[0], time.time())
+            self.sessions.move_to_end(key)
 
-    def purge_old(self, cutoff=1800):
+    def purge_old(self, cutoff=None):
+        # Entries are ordered by last use, so only the expired front of the dict is visited.
+        # Without a fixed cutoff the adaptive TTL is re-read after every pop: it grows as the
+        # count falls, so a purge trims back toward `low` instead of emptying everything at `high`.
         now = time.time()
-        for k, t in list(self.last_used.items()):
-            if now - t > cutoff:
-                self.sessions.pop(k, None)
-                self.last_used.pop(k, None)
+        while self.sessions:
+            limit = self.effective_ttl() if cutoff is None else cutoff
+            if now - next(iter(self.sessions.values()))[1] <= limit:
+                break
+            self.sessions.popitem(last=False)
+
+    def next_expiry(self):
+        """When the least recently used session expires, or None if there are no sessions."""
+        if not self.sessions:
+            return None
+        return next(iter(self.sessions.values()))[1] + self.effective_ttl()
+
+    def effective_ttl(self):
+        """The base TTL, scaled down as the number of live sessions climbs from low to high."""
+        n = len(self.sessions)
+        if n <= self.low:
+            return self.ttl
+        if n >= self.high:
+            return 0
+        return self.ttl * (1 - (n - self.low) / (self.high - self.low))
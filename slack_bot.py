@@ -3,163 +3,337 @@ Simplified Slack bot runner for single process execution.
 """
 
 import asyncio
+import heapq
 import logging
-from typing import Set, Optional
+import random
+import signal
+import socket
+import time
+from typing import Dict, List, Optional, Set, Tuple
+import aiohttp
 from aiohttp import web
 
 from slack_bolt.async_app import AsyncApp
+from slack_sdk.web.async_client import AsyncWebClient
 from config_loader import Config
-from agent_engine_client import AgentEngineClient, AgentEngineConfig
+from agent_engine_client import AgentEngineClient
 from slack_message_handler import EnhancedSlackMessageHandler
 from session_manager import SessionManager
 from passive_monitoring import PassiveMessageHandler
 from thread_link_storage import ThreadLinkStorage
 from metrics_tracker import MetricsCSVTracker
+from gcs_tools import close_async_storage
 
 
 class SlackBot:
     """
     Simplified Slack bot that runs in the main process.
     """
+
+    # How long shutdown waits for in-flight events before cancelling them
+    SHUTDOWN_GRACE_SECONDS = 5
+    # Reactions to the same message within this window are handled as one batch
+    REACTION_COALESCE_SECONDS = 0.5
+    # How often passive monitoring reviews its watched threads, +/- a per-bot jitter
+    THREAD_REVIEW_INTERVAL_SECONDS = 300
+    THREAD_REVIEW_JITTER_SECONDS = 30
     
     def __init__(self, config: Config, port: int):
         """
         Initialize the Slack bot.
         """
         self.config = config
+        self.bot_name = config.slack_bot.name
         self.port = port
-        self.logger = logging.getLogger(f"{__name__}.{config.slack_bot.name}")
-        self.background_tasks: Set[asyncio.Task] = set()
+        self.logger = logging.getLogger(f"{__name__}.{self.bot_name}")
         self.aiohttp_runner: Optional[web.AppRunner] = None
+        # One task per Slack event; Agent Engine calls are bounded in AgentEngineClient instead
+        self._event_tasks: Set[asyncio.Task] = set()
+        # Pending reaction_added events by (channel, message ts), flushed after the coalescing window
+        self._reaction_buf: Dict[Tuple[str, str], List[dict]] = {}
+        # Flush timer and Slack client for each pending batch, so shutdown can flush them early
+        self._reaction_timers: Dict[Tuple[str, str], Tuple[asyncio.TimerHandle, AsyncWebClient]] = {}
+        # Seeded by bot name so each bot's review timer is stable but offset from the others
+        self._jitter = random.Random(self.bot_name)
+
+        # Passive monitoring and its thread links are only built if some channel is monitored
+        self.passive_enabled = bool(config.passive_monitoring.channel_mappings)
+        self._thread_linker = None
+        self._passive_message_handler = None
+        # "<@BOT_USER_ID>", resolved at startup to route each message to a single handler
+        self._bot_mention: Optional[str] = None
 
         # Initialize shared components
-        self.thread_linker = ThreadLinkStorage(
-            path=config.passive_monitoring.thread_link_storage_path
-        )
         self.metrics_tracker = MetricsCSVTracker(
             config=config.metrics,
-            bot_name=config.slack_bot.name
+            bot_name=self.bot_name
         )
 
+        # One pooled session for every Slack Web API call (Bolt's per-request clients reuse it);
+        # without it slack_sdk opens a new session, and TLS connection, for each request.
+        # Only a handful of hosts are involved, so DNS answers are cached and connections kept warm.
+        self.http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=200,
+                limit_per_host=50,
+                use_dns_cache=True,
+                ttl_dns_cache=300,
+                keepalive_timeout=75,
+                enable_cleanup_closed=True,
+            )
+        )
         self.app = AsyncApp(
-            token=config.slack_bot.bot_token,
+            client=AsyncWebClient(token=config.slack_bot.bot_token, session=self.http_session),
             signing_secret=config.slack_bot.signing_secret
         )
         
         self.session_manager = SessionManager(
-            ttl_minutes=config.global_settings.session_timeout_minutes
+            ttl_minutes=config.global_settings.session_timeout_minutes,
+            low=config.global_settings.session_low,
+            high=config.global_settings.session_high
         )
         
-        agent_config = AgentEngineConfig(
-            api_key=config.agent_engine.api_key,
-            endpoint=config.agent_engine.endpoint,
-            project=config.agent_engine.project,
-            location=config.agent_engine.location,
-            reasoning_engine_id=config.agent_engine.reasoning_engine_id,
-            session_storage_path=config.agent_engine.session_storage_path
-        )
-        self.agent_client = AgentEngineClient(agent_config)
+        self.agent_client = AgentEngineClient(config.agent_engine)
         
         # Initialize message handlers with shared components
         self.message_handler = EnhancedSlackMessageHandler(
             session_mgr=self.session_manager,
             agent_client=self.agent_client,
-            bot_name=config.slack_bot.name,
-            thread_linker=self.thread_linker,
-            metrics_tracker=self.metrics_tracker
-        )
-
-        self.passive_message_handler = PassiveMessageHandler(
-            client=self.app.client,
-            agent_engine_client=self.agent_client,
-            config=self.config.passive_monitoring,
-            thread_linker=self.thread_linker,
+            bot_name=self.bot_name,
+            thread_linker=self.thread_linker if self.passive_enabled else None,
             metrics_tracker=self.metrics_tracker
         )
         
+        self._handle_active_message = self.message_handler.handle_message
         self._register_handlers()
         
-        self.logger.info(f"Initialized bot '{config.slack_bot.name}' for port {port}")
+        self.logger.info("Initialized bot '%s' for port %s", self.bot_name, port)
     
+    @property
+    def thread_linker(self):
+        if self._thread_linker is None:
+            self._thread_linker = ThreadLinkStorage(
+                path=self.config.passive_monitoring.thread_link_storage_path
+            )
+        return self._thread_linker
+
+    @property
+    def passive_message_handler(self):
+        if self._passive_message_handler is None:
+            self._passive_message_handler = PassiveMessageHandler(
+                client=self.app.client,
+                agent_engine_client=self.agent_client,
+                config=self.config.passive_monitoring,
+                thread_linker=self.thread_linker,
+                metrics_tracker=self.metrics_tracker
+            )
+        return self._passive_message_handler
+
     def _register_handlers(self):
-        """Register Slack event handlers."""
+        """
+        Register Slack event handlers.
+
+        Bolt acks event requests itself; the listeners only spawn a task for the work, so a
+        slow Agent Engine call never holds up intake of new events.
+        """
+        # Bound once here rather than looked up on self for every event
+        enqueue = self._spawn_event
+        on_message = self._handle_message_event
+        buffer_reaction = self._buffer_reaction
+        on_assistant_thread_started = self.message_handler.handle_assistant_thread_started
         
         @self.app.event("message")
         async def handle_message(event, say, client):
-            await self.message_handler.handle_message(event, say, client)
-            await self.passive_message_handler.handle_message(event)
+            enqueue(on_message, event, say, client)
         
         @self.app.event("reaction_added")
         async def handle_reaction_added(event, client):
-            await self.message_handler.handle_reaction_added(event, client)
+            buffer_reaction(event, client)
 
         @self.app.event("assistant_thread_started")
         async def handle_assistant_thread_started(event, say, client):
             """Handle reactions added to messages."""
-            await self.message_handler.handle_assistant_thread_started(event, say, client)
+            enqueue(on_assistant_thread_started, event, say, client)
         
         self.logger.info("Registered Slack event handlers")
-    
-    def _create_background_task(self, coro):
-        task = asyncio.create_task(coro)
-        self.background_tasks.add(task)
-        task.add_done_callback(self.background_tasks.discard)
 
+    async def _handle_message_event(self, event, say, client):
+        # The active handler only acts on DMs and messages mentioning the bot, and passive
+        # monitoring ignores exactly those, so each message needs just one of them
+        bot_mention = self._bot_mention
+        active = self._handle_active_message
+        if bot_mention is None:
+            await active(event, say, client)
+            if self.passive_enabled:
+                await self.passive_message_handler.handle_message(event)
+        elif event.get("channel_type") == "im" or bot_mention in (event.get("text") or ""):
+            await active(event, say, client)
+        elif self.passive_enabled:
+            await self.passive_message_handler.handle_message(event)
+
+    def _buffer_reaction(self, event, client):
+        item = event.get("item") or {}
+        key = (item.get("channel"), item.get("ts"))
+        pending = self._reaction_buf.get(key)
+        if pending is not None:
+            pending.append(event)
+            return
+        self._reaction_buf[key] = [event]
+        timer = asyncio.get_running_loop().call_later(
+            self.REACTION_COALESCE_SECONDS, self._flush_reactions, key, client
+        )
+        self._reaction_timers[key] = (timer, client)
+
+    def _flush_reactions(self, key, client):
+        del self._reaction_timers[key]
+        events = self._reaction_buf.pop(key)
+        self._spawn_event(self.message_handler.handle_reaction_added_batch, events, client)
+
+    def _flush_all_reactions(self):
+        """Hand every pending reaction batch to a task now instead of when its timer fires."""
+        for key, (timer, client) in list(self._reaction_timers.items()):
+            timer.cancel()
+            self._flush_reactions(key, client)
+
+    def _spawn_event(self, handler, *args):
+        task = asyncio.create_task(self._run_event(handler, args))
+        self._event_tasks.add(task)
+        task.add_done_callback(self._event_tasks.discard)
+
+    async def _run_event(self, handler, args):
+        try:
+            await handler(*args)
+        except Exception as e:
+            self.logger.error("Error handling Slack event in %s: %s", handler.__name__, e, exc_info=True)
+    
     async def start_async(self):
-        self.logger.info(f"Starting Slack bot server on port {self.port}")
-        
-        self._create_background_task(self.cleanup_sessions())
-        self._create_background_task(self.review_threads_periodically())
+        """Start the server and run until SIGINT/SIGTERM; the caller then runs stop()."""
+        self.logger.info("Starting Slack bot server on port %s", self.port)
 
-        server = self.app.server(port=self.port, path="/slack/events")
-        self.aiohttp_runner = web.AppRunner(server.web_app)
-        await self.aiohttp_runner.setup()
-        
-        site = web.TCPSite(self.aiohttp_runner, host="0.0.0.0", port=self.port)
-        await site.start()
+        loop = asyncio.get_running_loop()
+        shutdown = loop.create_future()
+        try:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, lambda: shutdown.done() or shutdown.set_result(None))
+        except NotImplementedError:
+            # Windows event loops have no signal handlers; Ctrl-C there raises KeyboardInterrupt,
+            # which cancels this task and main.py's cleanup still runs stop()
+            self.logger.info("Signal handlers unavailable; shutting down on KeyboardInterrupt instead")
         
-        self.logger.info("Bolt app is running!")
+        # Background tasks live in a TaskGroup: leaving it (normally or on error) cancels
+        # and awaits all of them, and a failure in one is raised here instead of lost
+        async with asyncio.TaskGroup() as tg:
+            background = [tg.create_task(self.run_scheduler(), name="scheduler")]
+
+            # Both open pooled connections before the first event: a HEAD to Agent Engine,
+            # and auth.test over the shared Slack session
+            await asyncio.gather(self.agent_client.warmup(), self._resolve_bot_mention())
+
+            server = self.app.server(port=self.port, path="/slack/events")
+            self.aiohttp_runner = web.AppRunner(server.web_app)
+            await self.aiohttp_runner.setup()
+            
+            # Opt-in SO_REUSEPORT lets copies of this bot share the port, with the kernel balancing
+            # between them; without it, a second process on the port fails with EADDRINUSE
+            reuse_port = self.config.global_settings.reuse_port
+            if reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+                self.logger.warning("reuse_port is set but SO_REUSEPORT is unavailable on this platform")
+                reuse_port = False
+            site = web.TCPSite(self.aiohttp_runner, host="0.0.0.0", port=self.port, reuse_port=reuse_port)
+            await site.start()
+            
+            self.logger.info("Bolt app is running!")
+
+            await shutdown
+            self.logger.info("Shutdown signal received, initiating shutdown.")
 
+            # Close the listener first: anything Bolt acks from here on would be dropped, and
+            # Slack doesn't retry acked events, whereas unacked ones are redelivered
+            await site.stop()
+            # Buffered reactions were already acked too; start them so the drain covers them
+            self._flush_all_reactions()
+
+            # Let events already accepted finish, but never wait unboundedly
+            if self._event_tasks:
+                _, unfinished = await asyncio.wait(self._event_tasks, timeout=self.SHUTDOWN_GRACE_SECONDS)
+                if unfinished:
+                    self.logger.warning(
+                        "%s events still unfinished after %ss; cancelling them",
+                        len(unfinished), self.SHUTDOWN_GRACE_SECONDS,
+                    )
+                    for task in unfinished:
+                        task.cancel()
+                    await asyncio.wait(unfinished)
+
+            self.logger.info("Cancelling %s background tasks...", len(background))
+            for task in background:
+                task.cancel()
+        self.logger.info("All background tasks have been cancelled.")
+
+    async def _resolve_bot_mention(self):
         try:
-            await asyncio.Event().wait()
-        except asyncio.CancelledError:
-            self.logger.info("Main server task cancelled, initiating shutdown.")
+            auth_response = await self.app.client.auth_test()
+        except Exception as e:
+            self.logger.warning("Could not resolve bot user ID, messages go to both handlers: %s", e)
+            return
+        bot_user_id = auth_response["user_id"]
+        self._bot_mention = f"<@{bot_user_id}>"
+        self.message_handler.bot_user_id = bot_user_id
+        self.message_handler.bot_mention = self._bot_mention
 
     async def stop(self):
-        self.logger.info("Stopping Slack bot and background tasks...")
-        
-        tasks = list(self.background_tasks)
-        if tasks:
-            self.logger.info(f"Cancelling {len(tasks)} background tasks...")
-            for task in tasks:
-                task.cancel()
-            await asyncio.gather(*tasks, return_exceptions=True)
-            self.logger.info("All background tasks have been cancelled.")
+        self.logger.info("Stopping Slack bot...")
 
         if self.aiohttp_runner:
             await self.aiohttp_runner.cleanup()
             self.logger.info("AIOHTTP server runner cleaned up.")
 
-    async def cleanup_sessions(self):
-        while True:
-            try:
-                await asyncio.sleep(300)
-                cutoff = self.config.global_settings.session_timeout_minutes * 60
-                self.session_manager.purge_old(cutoff)
-                self.logger.debug("Cleaned up old sessions")
-            except asyncio.CancelledError:
-                self.logger.info("Session cleanup task cancelled.")
-                break
-            except Exception as e:
-                self.logger.error(f"Error during session cleanup: {e}")
-
-    async def review_threads_periodically(self):
-        while True:
-            try:
-                await asyncio.sleep(300)
-                await self.passive_message_handler.review_watched_threads()
-            except asyncio.CancelledError:
-                self.logger.info("Thread review task cancelled.")
-                break
-            except Exception as e:
-                self.logger.error(f"Error during passive thread review: {e}")
+        await self.http_session.close()
+
+        await self.agent_client.aclose()
+        self.metrics_tracker.close()
+        await close_async_storage()
+
+    async def run_scheduler(self):
+        """
+        Run the periodic jobs from one task. Each job returns the delay until its next run,
+        and the task sleeps until whichever job is due first.
+        """
+        now = time.monotonic()
+        jobs = [(now + self._session_cleanup_delay(), "session cleanup", self.cleanup_sessions)]
+        if self.passive_enabled:
+            jobs.append((now + self._review_interval(), "passive thread review", self.review_threads))
+        heapq.heapify(jobs)
+        try:
+            while True:
+                run_at, name, job = jobs[0]
+                await asyncio.sleep(max(run_at - time.monotonic(), 0))
+                try:
+                    delay = await job()
+                except Exception as e:
+                    self.logger.error("Error during %s: %s", name, e)
+                    delay = self.THREAD_REVIEW_INTERVAL_SECONDS
+                heapq.heapreplace(jobs, (time.monotonic() + delay, name, job))
+        except asyncio.CancelledError:
+            self.logger.info("Scheduler task cancelled.")
+
+    def _session_cleanup_delay(self) -> float:
+        # Due when the oldest session expires rather than on a fixed interval. With no sessions,
+        # nothing created meanwhile can expire sooner than one TTL from now.
+        next_expiry = self.session_manager.next_expiry()
+        if next_expiry is None:
+            return self.session_manager.ttl
+        return max(next_expiry - time.time(), 0)
+
+    async def cleanup_sessions(self) -> float:
+        self.session_manager.purge_old()
+        self.logger.debug("Cleaned up old sessions")
+        return self._session_cleanup_delay()
+
+    async def review_threads(self) -> float:
+        await self.passive_message_handler.review_watched_threads()
+        return self._review_interval()
+
+    def _review_interval(self) -> float:
+        jitter = self.THREAD_REVIEW_JITTER_SECONDS
+        return self.THREAD_REVIEW_INTERVAL_SECONDS + self._jitter.uniform(-jitter, jitter)
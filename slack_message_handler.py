@@ -3,13 +3,14 @@ Enhanced Slack message handler with reaction logging and relay support.
 """
 
 import asyncio
-import json
 import logging
 import re
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Dict, Set
+from typing import Optional, Dict, List
 
+import orjson
+from cachetools import TTLCache
 from slack_sdk.web.async_client import AsyncWebClient
 from slack_sdk.errors import SlackApiError
 from slack_bolt.async_app import AsyncSay
@@ -19,24 +20,45 @@ from session_manager import SessionManager
 from agent_engine_client import AgentEngineClient
 from thread_link_storage import ThreadLinkStorage
 from deduplication import deduplicate_event
-from gcs_tools import upload_json_to_gcs
+from gcs_tools import upload_json_to_gcs_async
 from metrics_tracker import MetricsCSVTracker
 
 
-def remove_bot_mention(text: str, bot_user_id: str) -> str:
-    """Removes only the specific bot's mention from text."""
-    pattern = f'<@{bot_user_id}>'
-    return text.replace(pattern, "").strip()
+def _write_log(path: Path, log_data: dict):
+    """Write a thread log as indented UTF-8 JSON."""
+    path.write_bytes(orjson.dumps(log_data, option=orjson.OPT_INDENT_2))
+
+
+_MD_BOLD = re.compile(r'\*\*(.*?)\*\*')
+_MD_BULLET = re.compile(r'^\s*\*\s+', re.MULTILINE)
+_MD_NUM = re.compile(r'^\s*\d+\.\s+', re.MULTILINE)
+_MD_NESTED = re.compile(r' {4,}[*-] ')
+_MD_LINK = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')
+_MD_BLANKS = re.compile(r'\n{3,}')
+
+_MENTION_RE = re.compile(r'<@([A-Z0-9]+)>')
 
 
 def markdown_to_slack(text: str) -> str:
     """Convert markdown formatting to Slack-compatible formatting."""
-    text = re.sub(r'\*\*(.*?)\*\*', r'*\1*', text)
-    text = re.sub(r'^\s*\*\s+', '• ', text, flags=re.MULTILINE)
-    text = re.sub(r'^\s*\d+\.\s+', '• ', text, flags=re.MULTILINE)
-    text = re.sub(r' {4,}[*-] ', ' - ', text)
-    text = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'<\2|\1>', text)
-    text = re.sub(r'\n{3,}', '\n\n', text)
+    # Text with none of the characters the rules need is returned as is. Without a newline,
+    # a numbered item can only be at the very start, and a nested dash needs "    - "
+    if ('*' not in text and '[' not in text and '\n' not in text and '    - ' not in text
+            and not text.lstrip()[:1].isdigit()):
+        return text.strip()
+    # Each pass runs only if the text still contains a literal its pattern can't match without
+    if '**' in text:
+        text = _MD_BOLD.sub(r'*\1*', text)
+    if '*' in text:
+        text = _MD_BULLET.sub('• ', text)
+    if '.' in text:
+        text = _MD_NUM.sub('• ', text)
+    if '    ' in text:
+        text = _MD_NESTED.sub(' - ', text)
+    if '](' in text:
+        text = _MD_LINK.sub(r'<\2|\1>', text)
+    if '\n\n\n' in text:
+        text = _MD_BLANKS.sub('\n\n', text)
     return text.strip()
 
 
@@ -46,12 +68,17 @@ class EnhancedSlackMessageHandler:
     from notification channels back to original user threads.
     """
 
+    # Resolved user emails are reused for this long before users.info is asked again
+    EMAIL_CACHE_TTL_SECONDS = 3600
+    # At most this many users.info calls in flight, to stay clear of Slack's rate limits
+    USERS_INFO_CONCURRENCY = 5
+
     def __init__(
         self,
         session_mgr: SessionManager,
         agent_client: AgentEngineClient,
         bot_name: str,
-        thread_linker: ThreadLinkStorage,
+        thread_linker: Optional[ThreadLinkStorage],
         metrics_tracker: MetricsCSVTracker,
     ):
         self.session_mgr = session_mgr
@@ -61,18 +88,30 @@ class EnhancedSlackMessageHandler:
         self.metrics_tracker = metrics_tracker
         self.logger = logging.getLogger(f"{__name__}.{bot_name}")
         self.bot_user_id: Optional[str] = None
+        # "<@bot_user_id>", set together with bot_user_id
+        self.bot_mention: Optional[str] = None
+        # Concurrent first lookups wait on one auth.test call instead of each making their own
+        self._bot_id_lock = asyncio.Lock()
+        self._email_cache = TTLCache(maxsize=4096, ttl=self.EMAIL_CACHE_TTL_SECONDS)
+        # One lock per user being looked up, so concurrent misses share a single users.info call
+        self._email_locks: Dict[str, asyncio.Lock] = {}
+        self._users_info_sem = asyncio.Semaphore(self.USERS_INFO_CONCURRENCY)
         self.logs_dir = Path("logs")
         self.logs_dir.mkdir(exist_ok=True)
         self.logger.info(f"Enhanced message handler initialized for {bot_name}")
 
     async def _get_bot_user_id(self, client: AsyncWebClient):
-        if not self.bot_user_id:
-            try:
-                auth_response = await client.auth_test()
-                self.bot_user_id = auth_response["user_id"]
-                self.logger.info(f"Cached bot user ID: {self.bot_user_id}")
-            except SlackApiError as e:
-                self.logger.error(f"Cannot get bot user ID: {e}")
+        if self.bot_user_id:
+            return self.bot_user_id
+        async with self._bot_id_lock:
+            if not self.bot_user_id:
+                try:
+                    auth_response = await client.auth_test()
+                    self.bot_user_id = auth_response["user_id"]
+                    self.bot_mention = f"<@{self.bot_user_id}>"
+                    self.logger.info(f"Cached bot user ID: {self.bot_user_id}")
+                except SlackApiError as e:
+                    self.logger.error(f"Cannot get bot user ID: {e}")
         return self.bot_user_id
 
     async def _generate_relay_intro(self) -> str:
@@ -81,17 +120,22 @@ class EnhancedSlackMessageHandler:
             "Write a very brief, friendly, one-sentence introduction. For example: 'I have an update from the team:' "
             "or 'Here's some more information from the support team:'"
         )
-        intro = ""
+        parts = []
         async for chunk in self.agent_client.stream_query(None, "relay_intro_generator", prompt):
-            intro += chunk
-        return intro.strip()
+            parts.append(chunk)
+        return "".join(parts).strip()
 
     async def _relay_support_message(self, event: dict, client: AsyncWebClient) -> bool:
         thread_ts = event.get("thread_ts")
+        # Without passive monitoring there are no notification threads to relay from, and
+        # notification threads are never DMs; the link lookup is only made for the rest
+        if not thread_ts or self.thread_linker is None or event.get("channel_type") == "im":
+            return False
         text = event.get("text", "")
-        bot_user_id = await self._get_bot_user_id(client)
+        await self._get_bot_user_id(client)
+        bot_mention = self.bot_mention
 
-        if not thread_ts or f"<@{bot_user_id}>" not in text:
+        if not bot_mention or bot_mention not in text:
             return False
 
         link_info = self.thread_linker.get_link(notification_ts=thread_ts)
@@ -102,7 +146,7 @@ class EnhancedSlackMessageHandler:
 
         original_channel = link_info["original_channel_id"]
         original_thread_ts = link_info["original_thread_ts"]
-        support_message = remove_bot_mention(text, bot_user_id)
+        support_message = text.replace(bot_mention, "").strip()
         intro = await self._generate_relay_intro()
         relay_text = f"{intro}\n\n> {support_message}"
 
@@ -146,7 +190,7 @@ class EnhancedSlackMessageHandler:
             channel = event["channel"]
             channel_type = event.get("channel_type", "")
             
-            should_respond = (channel_type == "im") or (f"<@{bot_user_id}>" in text)
+            should_respond = (channel_type == "im") or (self.bot_mention in text)
             if not should_respond:
                 return
 
@@ -176,31 +220,49 @@ class EnhancedSlackMessageHandler:
                 pass
 
     async def handle_reaction_added(self, event: dict, client: AsyncWebClient):
+        await self.handle_reaction_added_batch([event], client)
+
+    async def handle_reaction_added_batch(self, events: List[dict], client: AsyncWebClient):
+        """
+        Handle a burst of reaction_added events on the same message. The thread is fetched
+        once, and each reacting user's thread is logged once, for their latest reaction.
+        """
         try:
             bot_user_id = await self._get_bot_user_id(client)
             if not bot_user_id: return
 
-            reacted_item = event.get("item", {})
+            reacted_item = events[0].get("item", {})
             if reacted_item.get("type") != "message": return
 
             channel = reacted_item.get("channel")
             message_ts = reacted_item.get("ts")
             if not channel or not message_ts: return
 
+            # The event names the reacted message's author, so reactions to other users'
+            # messages are dropped without any API call
+            item_user = events[0].get("item_user")
+            if item_user is not None and item_user != bot_user_id: return
+
+            # One conversations.replies call both confirms authorship and provides the thread to log
             try:
-                resp = await client.conversations_history(channel=channel, oldest=message_ts, latest=message_ts, inclusive=True, limit=1)
-                if not resp.get("messages"):
-                    self.logger.warning(f"Could not find reacted message {message_ts} in {channel}")
-                    return
-                original_message = resp["messages"][0]
+                resp = await client.conversations_replies(channel=channel, ts=message_ts)
             except SlackApiError as e:
                 self.logger.error(f"Cannot fetch reacted message: {e}")
                 return
+            messages = resp.get("messages", [])
+            original_message = next((msg for msg in messages if msg.get("ts") == message_ts), None)
+            if original_message is None:
+                self.logger.warning(f"Could not find reacted message {message_ts} in {channel}")
+                return
 
             if original_message.get("user") != bot_user_id: return
 
             thread_ts = original_message.get("thread_ts") or original_message.get("ts")
-            await self._log_thread_for_review(client, channel, thread_ts, event)
+            latest_by_user = {event.get("user"): event for event in events}
+            await asyncio.gather(*(
+                self._log_thread_for_review(client, channel, thread_ts, event, messages)
+                for event in latest_by_user.values()
+            ))
 
         except Exception:
             self.logger.exception("Error handling reaction_added event")
@@ -208,29 +270,27 @@ class EnhancedSlackMessageHandler:
     async def _get_thread_context(self, client: AsyncWebClient, channel: str, thread_ts: str, user_id: str) -> str:
         try:
             history = await client.conversations_replies(channel=channel, ts=thread_ts)
-            messages_to_format = []
-            user_ids_to_fetch: Set[str] = set()
+            entries = []
+            # Each user's email lookup starts as soon as they're first seen, overlapping the rest of the pass
+            email_tasks: Dict[str, asyncio.Task] = {}
+            bot_mention = self.bot_mention
 
             for msg in history.get("messages", []):
                 msg_user = msg.get("user")
-                if 'bot_id' in msg or msg_user == user_id or not msg.get("text", "").strip():
+                text = msg.get("text", "").strip()
+                if 'bot_id' in msg or msg_user == user_id or not text:
                     continue
-                messages_to_format.append(msg)
-                if msg_user:
-                    user_ids_to_fetch.add(msg_user)
-            
-            if not messages_to_format:
-                return ""
+                if bot_mention in text:
+                    text = text.replace(bot_mention, "").strip()
+                entries.append((msg_user, text))
+                if msg_user and msg_user not in email_tasks:
+                    email_tasks[msg_user] = asyncio.create_task(self._get_user_email(msg_user, client))
 
-            email_tasks = [self._get_user_email(uid, client) for uid in user_ids_to_fetch]
-            emails = await asyncio.gather(*email_tasks)
-            email_map = dict(zip(user_ids_to_fetch, emails))
+            if not entries:
+                return ""
 
-            formatted_messages = []
-            for msg in messages_to_format:
-                user_email = email_map.get(msg.get("user"), "unknown_user")
-                text = remove_bot_mention(msg.get("text", "").strip(), self.bot_user_id)
-                formatted_messages.append(f"<@{user_email}>: {text}\n")
+            email_map = dict(zip(email_tasks, await asyncio.gather(*email_tasks.values())))
+            formatted_messages = [f"<@{email_map.get(uid, 'unknown_user')}>: {text}\n" for uid, text in entries]
             
             return "\n".join(formatted_messages)
 
@@ -251,14 +311,17 @@ class EnhancedSlackMessageHandler:
         final_response = "".join(response_chunks) if response_chunks else "🤷 I don't have a response for that."
         await say(text=markdown_to_slack(final_response), thread_ts=thread_ts)
 
-    async def _log_thread_for_review(self, client: AsyncWebClient, channel: str, thread_ts: str, reaction_event: dict):
+    async def _log_thread_for_review(self, client: AsyncWebClient, channel: str, thread_ts: str, reaction_event: dict,
+                                     messages: Optional[List[dict]] = None):
         try:
-            history_response = await client.conversations_replies(channel=channel, ts=thread_ts)
-            messages = history_response.get("messages", [])
+            if messages is None:
+                history_response = await client.conversations_replies(channel=channel, ts=thread_ts)
+                messages = history_response.get("messages", [])
             if not messages: return
 
+            now = datetime.utcnow()
             log_data = {
-                "timestamp": datetime.utcnow().isoformat(),
+                "timestamp": now.isoformat(),
                 "bot_name": self.bot_name,
                 "channel": channel,
                 "thread_ts": thread_ts,
@@ -266,15 +329,18 @@ class EnhancedSlackMessageHandler:
                 "thread_messages": messages
             }
 
-            timestamp_str = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-            filename = f"thread_{timestamp_str}_{channel}_{thread_ts.replace('.', '_')}.json"
+            # Shared by the local log and the GCS learning log names
+            name_suffix = f"{now.strftime('%Y%m%d_%H%M%S')}_{channel}_{thread_ts.replace('.', '_')}.json"
+            filename = f"thread_{name_suffix}"
             log_file_path = self.logs_dir / filename
 
-            with open(log_file_path, 'w', encoding='utf-8') as f:
-                json.dump(log_data, f, indent=2, ensure_ascii=False)
+            # Disk write and the Vertex AI call are blocking; run them off the event loop
+            await asyncio.to_thread(_write_log, log_file_path, log_data)
             self.logger.info(f"Logged thread to: {log_file_path}")
 
-            reaction_response = analyze_log_vertexai_with_json(log_data, reaction_event.get("user"))
+            reaction_response = await asyncio.to_thread(
+                analyze_log_vertexai_with_json, log_data, reaction_event.get("user")
+            )
             
             cleaned_log = remove_friendly_response_field(reaction_response)
             sentiment = cleaned_log.get("sentiment")
@@ -291,38 +357,63 @@ class EnhancedSlackMessageHandler:
                 await client.chat_postMessage(channel=channel, text=friendly_message, thread_ts=thread_ts)
                 self.logger.info(f"Posted friendly feedback message to thread {thread_ts}")
 
-            learning_filename = f"learning_{timestamp_str}_{channel}_{thread_ts.replace('.', '_')}.json"
-            upload_json_to_gcs(cleaned_log, learning_filename, self.bot_name)
+            learning_filename = f"learning_{name_suffix}"
+            await upload_json_to_gcs_async(cleaned_log, learning_filename, self.bot_name)
             self.logger.info(f"Uploaded learning log to GCS for thread {thread_ts}")
 
         except Exception as e:
             self.logger.error(f"Error logging thread for review: {e}")
 
     async def replace_mentions_with_emails(self, text: str, client: AsyncWebClient) -> str:
-        pattern = r'<@([A-Z0-9]+)>'
-        user_ids = set(re.findall(pattern, text))
-        if not user_ids:
+        if '<@' not in text:
+            return text
+        # One scan records every mention's span; the output is then stitched from slices
+        matches = [(m.start(), m.end(), m.group(1)) for m in _MENTION_RE.finditer(text)]
+        if not matches:
             return text
 
+        user_ids = list({user_id for _, _, user_id in matches})
         email_tasks = [self._get_user_email(uid, client) for uid in user_ids]
         emails = await asyncio.gather(*email_tasks)
         email_map = dict(zip(user_ids, emails))
-        
-        def replace_mention(match):
-            user_id = match.group(1)
-            return email_map.get(user_id, match.group(0))
 
-        return re.sub(pattern, replace_mention, text)
+        parts = []
+        pos = 0
+        for start, end, user_id in matches:
+            parts.append(text[pos:start])
+            parts.append(email_map[user_id])
+            pos = end
+        parts.append(text[pos:])
+        return "".join(parts)
 
     async def _get_user_email(self, user_id: str, client: AsyncWebClient) -> str:
+        email = self._email_cache.get(user_id)
+        if email is not None:
+            return email
+        lock = self._email_locks.setdefault(user_id, asyncio.Lock())
+        try:
+            async with lock:
+                email = self._email_cache.get(user_id)
+                if email is None:
+                    email = await self._fetch_user_email(user_id, client)
+        finally:
+            if not lock.locked():
+                self._email_locks.pop(user_id, None)
+        return email
+
+    async def _fetch_user_email(self, user_id: str, client: AsyncWebClient) -> str:
+        # Only successful lookups are cached; a failed one falls back to the raw ID and is retried next time
         try:
-            response = await client.users_info(user=user_id)
+            async with self._users_info_sem:
+                response = await client.users_info(user=user_id)
             if response["ok"]:
                 profile = response.get("user", {}).get("profile", {})
                 if profile.get("email"):
-                    return profile["email"]
+                    email = self._email_cache[user_id] = profile["email"]
+                    return email
                 if response.get("user", {}).get("is_bot"):
-                    return response.get("user", {}).get("real_name", user_id)
+                    name = self._email_cache[user_id] = response.get("user", {}).get("real_name", user_id)
+                    return name
         except SlackApiError as e:
             self.logger.warning(f"Failed to get email for user {user_id}: {e}")
         return user_id